@@ -0,0 +1,38 @@
+import asyncio
+import weakref
+import httpx
+from openai import AsyncOpenAI
+import config
+
+# One pooled HTTP client (and OpenAI client on top of it) per event loop;
+# connections cannot be shared across loops
+_clients = weakref.WeakKeyDictionary()
+
+def _for_loop():
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        http = httpx.AsyncClient(
+            timeout=httpx.Timeout(config.HTTP_TIMEOUT, connect=10),
+            limits=httpx.Limits(max_connections=config.ASYNC_MAX_CONNECTIONS,
+                                max_keepalive_connections=config.ASYNC_MAX_CONNECTIONS),
+            follow_redirects=True
+        )
+        _clients[loop] = {
+            'http': http,
+            'openai': AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http),
+        }
+    return _clients[loop]
+
+def http_client():
+    """Shared httpx.AsyncClient for the running event loop"""
+    return _for_loop()['http']
+
+def openai_client():
+    """Shared AsyncOpenAI client for the running event loop"""
+    return _for_loop()['openai']
+
+async def close():
+    """Close the running loop's clients (call before the loop ends)"""
+    clients = _clients.pop(asyncio.get_running_loop(), None)
+    if clients:
+        await clients['http'].aclose()
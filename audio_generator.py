@@ -1,62 +1,233 @@
-import requests
+import asyncio
+import contextvars
+import hashlib
+import json
+import re
 import os
+from concurrent.futures import ThreadPoolExecutor
+import async_clients
 import config
+import downloader
+import ffmpeg_utils
+import file_cache
+import llm
+import metrics
+import rate_limiter
 
-def generate_audio(script, output_path):
-    """Generate voiceover using ElevenLabs API"""
-    
-    if not config.ELEVENLABS_API_KEY:
-        print("⚠️  ElevenLabs API key not set, using OpenAI TTS")
-        return generate_audio_openai(script, output_path)
-    
-    url = "https://api.elevenlabs.io/v1/text-to-speech/21m00Tcm4TlvDq8ikWAM"
-    
+ELEVENLABS_VOICE = "21m00Tcm4TlvDq8ikWAM"
+ELEVENLABS_URL = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE}"
+ELEVENLABS_MODEL = "eleven_monolingual_v1"
+ELEVENLABS_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75
+}
+OPENAI_VOICE = "onyx"
+OPENAI_TTS_MODEL = "tts-1-hd"
+
+# End of a sentence (plus closing quotes) or a line break
+SENTENCE_END = re.compile(r'[.!?…]+["\'”’)]*\s+|\n+')
+
+def voice():
+    """provider/voice that will read the script, for per-voice duration calibration"""
+    return f"elevenlabs/{ELEVENLABS_VOICE}" if config.ELEVENLABS_API_KEY else f"openai/{OPENAI_VOICE}"
+
+def tts_spec():
+    """Everything besides the text that shapes a TTS clip"""
+    if config.ELEVENLABS_API_KEY:
+        return {'provider': 'elevenlabs', 'voice': ELEVENLABS_VOICE,
+                'model': ELEVENLABS_MODEL, 'settings': ELEVENLABS_SETTINGS}
+    return {'provider': 'openai', 'voice': OPENAI_VOICE, 'model': OPENAI_TTS_MODEL, 'settings': {}}
+
+def split_sentences(text):
+    """Complete sentences at the start of text, and the unfinished rest"""
+    sentences, start = [], 0
+    for match in SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = match.end()
+    return sentences, text[start:]
+
+def script_sentences(script):
+    sentences, rest = split_sentences(script)
+    return sentences + ([rest.strip()] if rest.strip() else [])
+
+def elevenlabs_request(script):
+    """Headers and JSON body for an ElevenLabs text-to-speech call"""
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
         "xi-api-key": config.ELEVENLABS_API_KEY
     }
-    
+
     data = {
         "text": script,
-        "model_id": "eleven_monolingual_v1",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75
-        }
+        "model_id": ELEVENLABS_MODEL,
+        "voice_settings": ELEVENLABS_SETTINGS
     }
-    
-    response = requests.post(url, json=data, headers=headers)
-    
-    if response.status_code == 200:
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-        return output_path
-    else:
-        raise Exception(f"Audio generation failed: {response.text}")
+    return headers, data
+
+def generate_audio_elevenlabs(script, output_path):
+    """Voice text in one ElevenLabs request, streamed to output_path"""
+    headers, data = elevenlabs_request(script)
+
+    def post():
+        return downloader.download(ELEVENLABS_URL, output_path, method='POST', json=data, headers=headers,
+                                   name='text-to-speech', provider='elevenlabs', model=ELEVENLABS_MODEL)
+
+    return rate_limiter.call('elevenlabs', ELEVENLABS_MODEL, post, chars=len(script))
 
 def generate_audio_openai(script, output_path):
     """Fallback: Generate audio using OpenAI TTS"""
-    from openai import OpenAI
-    client = OpenAI(api_key=config.OPENAI_API_KEY)
-    
-    response = client.audio.speech.create(
-        model="tts-1-hd",
-        voice="onyx",
-        input=script
-    )
-    
-    response.stream_to_file(output_path)
+    def create():
+        with metrics.span('audio.speech', provider='openai', model=OPENAI_TTS_MODEL) as span:
+            with llm.client().audio.speech.with_streaming_response.create(
+                model=OPENAI_TTS_MODEL,
+                voice=OPENAI_VOICE,
+                input=script
+            ) as response:
+                response.stream_to_file(output_path)
+            span['bytes'] = os.path.getsize(output_path)
+
+    rate_limiter.call('openai', OPENAI_TTS_MODEL, create, chars=len(script))
+    return output_path
+
+async def generate_audio_elevenlabs_async(script, output_path):
+    """generate_audio_elevenlabs() on the shared async HTTP client"""
+    headers, data = elevenlabs_request(script)
+
+    async def post():
+        return await downloader.download_async(ELEVENLABS_URL, output_path, method='POST', json=data,
+                                               headers=headers, name='text-to-speech',
+                                               provider='elevenlabs', model=ELEVENLABS_MODEL)
+
+    return await rate_limiter.call_async('elevenlabs', ELEVENLABS_MODEL, post, chars=len(script))
+
+async def generate_audio_openai_async(script, output_path):
+    """Async counterpart of generate_audio_openai()"""
+    aclient = async_clients.openai_client()
+
+    async def create():
+        with metrics.span('audio.speech', provider='openai', model=OPENAI_TTS_MODEL) as span:
+            async with aclient.audio.speech.with_streaming_response.create(
+                model=OPENAI_TTS_MODEL,
+                voice=OPENAI_VOICE,
+                input=script
+            ) as response:
+                await response.stream_to_file(output_path)
+            span['bytes'] = os.path.getsize(output_path)
+
+    await rate_limiter.call_async('openai', OPENAI_TTS_MODEL, create, chars=len(script))
     return output_path
 
+def _tts_cache():
+    return file_cache.get_cache(config.TTS_CACHE_DIR, config.TTS_CACHE_MAX_MB, '.mp3')
+
+def sentence_key(spec, text):
+    return hashlib.sha256(json.dumps([spec, text], sort_keys=True).encode()).hexdigest()
+
+def voice_sentence(text):
+    """(audio path, cached?) for one sentence, reusing audio of identical earlier sentences"""
+    spec = tts_spec()
+    key = sentence_key(spec, text)
+    cache = _tts_cache()
+    path = cache.get(key)
+    if path:
+        return path, True
+    tmp = cache.tmp_path(key)
+    synthesize = generate_audio_elevenlabs if spec['provider'] == 'elevenlabs' else generate_audio_openai
+    try:
+        synthesize(text, tmp)
+        return cache.put_file(key, tmp), False
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+async def voice_sentence_async(text, limit):
+    """voice_sentence() on the shared async clients, holding limit while synthesizing"""
+    spec = tts_spec()
+    key = sentence_key(spec, text)
+    cache = _tts_cache()
+    path = cache.get(key)
+    if path:
+        return path, True
+    async with limit:
+        tmp = cache.tmp_path(key)
+        synthesize = (generate_audio_elevenlabs_async if spec['provider'] == 'elevenlabs'
+                      else generate_audio_openai_async)
+        try:
+            await synthesize(text, tmp)
+            return cache.put_file(key, tmp), False
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+def stitch(results, output_path):
+    """Join sentence clips into output_path with even gaps; results are (path, cached?) pairs"""
+    if not results:
+        raise Exception("Audio generation failed: script has no sentences")
+    ffmpeg_utils.join_audio([path for path, _ in results], output_path, config.TTS_SENTENCE_GAP)
+    cached = sum(1 for _, hit in results if hit)
+    print(f"✓ Audio created: {output_path} ({len(results)} sentences, {cached} from cache)")
+    return output_path
+
+class SentenceVoiceover:
+    """Voiceover voiced sentence by sentence, TTS_WORKERS at a time.
+
+    Sentences can be added as they become available (e.g. from a streaming
+    script); finish() waits for all of them and stitches the clips in order.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.pool = ThreadPoolExecutor(max_workers=config.TTS_WORKERS)
+        self.futures = []
+
+    def add(self, sentence):
+        # Run in a copy of this context so spans stay attributed to the video
+        self.futures.append(self.pool.submit(contextvars.copy_context().run, voice_sentence, sentence))
+
+    def finish(self):
+        """Wait for every sentence and stitch them into output_path"""
+        try:
+            results = [future.result() for future in self.futures]
+        finally:
+            self.cancel()
+        return stitch(results, self.output_path)
+
+    def cancel(self):
+        """Drop queued sentences and wait out in-flight ones (their audio stays cached)"""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+def generate_audio(script, output_path):
+    """Generate voiceover sentence by sentence (ElevenLabs, else OpenAI TTS)"""
+    if not config.ELEVENLABS_API_KEY:
+        print("⚠️  ElevenLabs API key not set, using OpenAI TTS")
+
+    voiceover = SentenceVoiceover(output_path)
+    for sentence in script_sentences(script):
+        voiceover.add(sentence)
+    return voiceover.finish()
+
+async def generate_audio_async(script, output_path):
+    """generate_audio() on the shared async HTTP and OpenAI clients"""
+    if not config.ELEVENLABS_API_KEY:
+        print("⚠️  ElevenLabs API key not set, using OpenAI TTS")
+
+    limit = asyncio.Semaphore(config.TTS_WORKERS)
+    results = await asyncio.gather(*(voice_sentence_async(s, limit) for s in script_sentences(script)))
+    return await asyncio.to_thread(stitch, results, output_path)
+
+def audio_path_for(video_id):
+    os.makedirs(config.AUDIO_DIR, exist_ok=True)
+    return f"{config.AUDIO_DIR}/video_{video_id}.mp3"
+
 def create_audio(script, video_id):
     """Main function to create audio"""
     print("🎙️  Generating voiceover...")
-    
-    os.makedirs(config.AUDIO_DIR, exist_ok=True)
-    output_path = f"{config.AUDIO_DIR}/video_{video_id}.mp3"
-    
-    audio_path = generate_audio(script, output_path)
-    print(f"✓ Audio created: {audio_path}")
-    
-    return audio_path
+    return generate_audio(script, audio_path_for(video_id))
+
+async def create_audio_async(script, video_id):
+    """Async counterpart of create_audio()"""
+    print("🎙️  Generating voiceover...")
+    return await generate_audio_async(script, audio_path_for(video_id))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Batch production - run many pipeline jobs with bounded worker pools"""
+
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import config
+import async_clients
+import database
+import pipeline
+
+def render_video(*args, backend=None, profile='final', segment_workers=None):
+    """create_video for the render pool; flushes spans the worker process buffered"""
+    try:
+        return pipeline.video_generator.create_video(*args, backend=backend, profile=profile,
+                                                     segment_workers=segment_workers)
+    finally:
+        database.flush_logs()
+
+def render_process_pool(render_workers):
+    """Process pool for renders, spawned rather than forked.
+
+    Job threads are already running when it starts, and a forked child could
+    inherit a lock one of them holds (rate limiter, API clients) and deadlock.
+    """
+    return ProcessPoolExecutor(max_workers=render_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def run_batch(jobs, api_workers=None, render_workers=None, render_backend=None):
+    """Run many pipeline jobs and return a throughput report.
+
+    Each job is a dict with optional keys: topic, channel_id, content_source.
+    At most api_workers API-bound stages (sourcing, script, TTS, SEO,
+    scheduling) run at once across the whole batch, and rendering runs in a
+    process pool of render_workers.
+    """
+    api_workers = api_workers or config.BATCH_API_WORKERS
+    render_workers = render_workers or config.BATCH_RENDER_WORKERS
+    database.init_db()
+
+    gates = {
+        'api': threading.BoundedSemaphore(api_workers),
+        'render': threading.BoundedSemaphore(render_workers),
+    }
+    results = []
+
+    print("\n" + "="*60)
+    print(f"📦 BATCH: {len(jobs)} jobs ({api_workers} API workers, {render_workers} render workers)")
+    print("="*60)
+
+    start = time.perf_counter()
+    with render_process_pool(render_workers) as render_pool:
+        def render(*args, **kwargs):
+            return render_pool.submit(render_video, *args, backend=render_backend,
+                                      segment_workers=pipeline.segment_workers(render_workers), **kwargs).result()
+
+        def run_job(job):
+            timings = {}
+            try:
+                video_id = pipeline.run_pipeline(
+                    channel_id=job.get('channel_id', 1),
+                    content_source=job.get('content_source', 'custom' if job.get('topic') else 'trending'),
+                    custom_topic=job.get('topic'),
+                    render=render,
+                    gates=gates,
+                    timings=timings
+                )
+            finally:
+                database.close_connection()
+            return video_id, timings
+
+        # Enough job threads to keep every API and render slot busy
+        with ThreadPoolExecutor(max_workers=api_workers + render_workers) as job_pool:
+            results = list(job_pool.map(run_job, jobs))
+    wall = time.perf_counter() - start
+
+    report = throughput_report(results, wall, {'api': api_workers, 'render': render_workers})
+    print_report(report)
+    return report
+
+def run_batch_async(jobs, api_workers=None, render_workers=None, render_backend=None):
+    """run_batch() with every job on one event loop instead of a thread each.
+
+    API stages share pooled async HTTP/OpenAI clients, so api_workers can be
+    set far higher than thread-per-job allows; rendering still uses a
+    process pool of render_workers.
+    """
+    api_workers = api_workers or config.BATCH_API_WORKERS
+    render_workers = render_workers or config.BATCH_RENDER_WORKERS
+    database.init_db()
+
+    print("\n" + "="*60)
+    print(f"📦 ASYNC BATCH: {len(jobs)} jobs ({api_workers} API slots, {render_workers} render workers)")
+    print("="*60)
+
+    async def run_all(render_pool):
+        gates = {
+            'api': asyncio.Semaphore(api_workers),
+            'render': asyncio.Semaphore(render_workers),
+        }
+
+        async def run_job(job):
+            timings = {}
+            video_id = await pipeline.run_pipeline_async(
+                channel_id=job.get('channel_id', 1),
+                content_source=job.get('content_source', 'custom' if job.get('topic') else 'trending'),
+                custom_topic=job.get('topic'),
+                render_executor=render_pool,
+                render=functools.partial(render_video, backend=render_backend,
+                                         segment_workers=pipeline.segment_workers(render_workers)),
+                gates=gates,
+                timings=timings
+            )
+            return video_id, timings
+
+        try:
+            return await asyncio.gather(*(run_job(job) for job in jobs))
+        finally:
+            await async_clients.close()
+
+    start = time.perf_counter()
+    with render_process_pool(render_workers) as render_pool:
+        results = asyncio.run(run_all(render_pool))
+    wall = time.perf_counter() - start
+
+    report = throughput_report(results, wall, {'api': api_workers, 'render': render_workers})
+    print_report(report)
+    return report
+
+def video_status(video_id):
+    row = database.get_video(video_id)
+    return dict(zip(database.VIDEO_COLUMNS, row))['status'] if row else None
+
+def throughput_report(results, wall, pool_sizes):
+    """Summarize batch results: videos/hour and per-stage/per-pool utilization"""
+    kinds = {key: kind for key, _, kind in pipeline.STAGE_GRAPH}
+    stage_busy = {}
+    for _, timings in results:
+        for stage_key, seconds in timings.items():
+            stage_busy[stage_key] = stage_busy.get(stage_key, 0) + seconds
+
+    pool_busy = {kind: 0 for kind in pool_sizes}
+    for stage_key, seconds in stage_busy.items():
+        pool_busy[kinds[stage_key]] += seconds
+
+    # A draft parked for review returns its id too, but has not reached scheduling
+    finished = [video_id for video_id, _ in results if video_id]
+    review = [video_id for video_id in finished if video_status(video_id) == 'review']
+    completed = [video_id for video_id in finished if video_id not in review]
+    return {
+        'jobs': len(results),
+        'completed': len(completed),
+        'awaiting_review': len(review),
+        'failed': len(results) - len(finished),
+        'video_ids': completed,
+        'review_ids': review,
+        'wall_seconds': round(wall, 1),
+        'videos_per_hour': round(len(completed) / wall * 3600, 2) if wall else 0,
+        'stage_seconds': {k: round(v, 1) for k, v in stage_busy.items()},
+        # Share of each stage's pool capacity it kept busy over the batch
+        'stage_utilization': {
+            k: round(v / (pool_sizes[kinds[k]] * wall), 3) if wall else 0
+            for k, v in stage_busy.items()
+        },
+        'pool_utilization': {
+            kind: round(pool_busy[kind] / (size * wall), 3) if wall else 0
+            for kind, size in pool_sizes.items()
+        },
+    }
+
+def print_report(report):
+    print("\n" + "="*60)
+    print("📊 BATCH REPORT")
+    print("="*60)
+    print(f"Completed: {report['completed']}/{report['jobs']} ({report['failed']} failed, "
+          f"{report['awaiting_review']} drafts awaiting review)")
+    print(f"Wall time: {report['wall_seconds']}s")
+    print(f"Throughput: {report['videos_per_hour']} videos/hour")
+    print("\nStage busy time (utilization of its pool):")
+    for stage_key, _, _ in pipeline.STAGE_GRAPH:
+        if stage_key in report['stage_seconds']:
+            print(f"  {stage_key:<22} {report['stage_seconds'][stage_key]:>8}s  "
+                  f"{report['stage_utilization'][stage_key]:.0%}")
+    print("\nPool utilization:")
+    for kind, util in report['pool_utilization'].items():
+        print(f"  {kind:<22} {util:.0%}")
+
+def load_jobs(args):
+    jobs = [{'topic': t, 'channel_id': args.channel} for t in args.topic]
+    if args.topics_file:
+        with open(args.topics_file) as f:
+            jobs += [{'topic': line.strip(), 'channel_id': args.channel} for line in f if line.strip()]
+    jobs += [{'channel_id': args.channel} for _ in range(args.trending)]
+    return jobs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Produce several videos in one batch')
+    parser.add_argument('--topic', action='append', default=[], help='custom topic (repeatable)')
+    parser.add_argument('--topics-file', help='file with one custom topic per line')
+    parser.add_argument('--trending', type=int, default=0, help='number of trending-topic videos')
+    parser.add_argument('--channel', type=int, default=1, help='channel id for all jobs')
+    parser.add_argument('--api-workers', type=int, default=config.BATCH_API_WORKERS)
+    parser.add_argument('--render-workers', type=int, default=config.BATCH_RENDER_WORKERS)
+    parser.add_argument('--render-backend', choices=['moviepy', 'ffmpeg'], default=config.RENDER_BACKEND)
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='run API stages on one event loop instead of a thread per job')
+    args = parser.parse_args()
+
+    jobs = load_jobs(args)
+    if not jobs:
+        parser.error('no jobs: pass --topic, --topics-file or --trending')
+    if args.use_async:
+        run_batch_async(jobs, args.api_workers, args.render_workers, args.render_backend)
+    else:
+        run_batch(jobs, args.api_workers, args.render_workers, args.render_backend)
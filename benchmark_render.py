@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Render benchmark - one video rendered in one pass and in parallel segments on 1..N cores"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import config
+import database
+import ffmpeg_utils
+import video_generator
+
+SCRIPT = ("Every morning you get a new chance to become the person you keep promising yourself "
+          "you will be. Small steps, taken daily, beat big plans that never start. ") * 4
+
+def core_counts(max_cores):
+    """1, 2, 4, ... up to and including max_cores"""
+    counts, n = [], 1
+    while n < max_cores:
+        counts.append(n)
+        n *= 2
+    return counts + [max_cores]
+
+def pin_to(cores):
+    """Restrict this process (and the renders it starts) to its first `cores` CPUs"""
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[:cores])
+
+def timed_render(backend, segments, audio_path, footage_paths, output_path, profile):
+    args = (audio_path, SCRIPT, None, footage_paths, output_path, profile)
+    start = time.perf_counter()
+    if segments > 1:
+        video_generator.render_segmented(backend, segments, *args)
+    else:
+        video_generator.RENDER_BACKENDS[backend](*args)
+    return time.perf_counter() - start
+
+def run_benchmark(audio_path, footage_paths, backend, profile_name, max_cores):
+    database.init_db()
+    profile = config.RENDER_PROFILES[profile_name]
+    duration = ffmpeg_utils.duration(audio_path)
+    all_cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+    out_dir = tempfile.mkdtemp(prefix='render_bench_')
+
+    print("\n" + "="*60)
+    print(f"⏱️  RENDER BENCHMARK: {duration:.1f}s video, {backend}, {profile_name} "
+          f"({profile['width']}x{profile['height']}@{profile['fps']}), up to {max_cores} cores")
+    print("="*60)
+
+    rows = []
+    try:
+        for cores in core_counts(max_cores):
+            pin_to(cores)
+            one_pass = timed_render(backend, 1, audio_path, footage_paths,
+                                    os.path.join(out_dir, f'one_pass_{cores}.mp4'), profile)
+            segmented_path = os.path.join(out_dir, f'segmented_{cores}.mp4')
+            segmented = timed_render(backend, cores, audio_path, footage_paths, segmented_path, profile)
+            rows.append((cores, one_pass, segmented, ffmpeg_utils.duration(segmented_path)))
+            if all_cpus:
+                os.sched_setaffinity(0, all_cpus)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    baseline = rows[0][1]
+    print(f"\n{'cores':>5}  {'one pass':>9}  {'segmented':>9}  {'speedup':>7}  {'output':>7}")
+    for cores, one_pass, segmented, length in rows:
+        print(f"{cores:>5}  {one_pass:>8.1f}s  {segmented:>8.1f}s  {baseline / segmented:>6.2f}x  {length:>6.1f}s")
+    print("\nSpeedup is against a one-pass render on 1 core.")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time one-pass and segmented renders from 1 to N cores')
+    parser.add_argument('--audio', required=True, help='voiceover to render against (sets the length)')
+    parser.add_argument('--footage', nargs='*', default=[], help='footage clips (colour background if none)')
+    parser.add_argument('--backend', choices=['moviepy', 'ffmpeg'], default=config.RENDER_BACKEND)
+    parser.add_argument('--profile', choices=sorted(config.RENDER_PROFILES), default='final')
+    parser.add_argument('--max-cores', type=int, default=video_generator.available_cpus())
+    args = parser.parse_args()
+
+    run_benchmark(args.audio, args.footage, args.backend, args.profile, args.max_cores)
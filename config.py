@@ -13,6 +13,8 @@ PEXELS_API_KEY = os.getenv('PEXELS_API_KEY')
 # Content Settings
 VIDEO_LENGTH_MIN = 45
 VIDEO_LENGTH_MAX = 120
+VIDEO_LENGTH_TARGET = 60  # seconds the script prompt aims for
+SCRIPT_LENGTH_RETRIES = 2  # trims/regenerations of a script outside VIDEO_LENGTH_MIN/MAX
 UPLOAD_FREQUENCY = 'daily'  # daily, twice_daily, weekly
 BEST_UPLOAD_TIMES = ['09:00', '15:00', '19:00']
 
@@ -20,6 +22,67 @@ BEST_UPLOAD_TIMES = ['09:00', '15:00', '19:00']
 VIDEO_WIDTH = 1920
 VIDEO_HEIGHT = 1080
 VIDEO_FPS = 60
+RENDER_BACKEND = os.getenv('RENDER_BACKEND', 'moviepy')  # moviepy, ffmpeg (one filtergraph, needs libass)
+RENDER_SEGMENT_WORKERS = int(os.getenv('RENDER_SEGMENT_WORKERS', os.cpu_count() or 1))  # segments of a video encoded at once; 1 renders in one pass
+RENDER_SEGMENT_MIN_SECONDS = 10  # shortest segment worth its own process
+SUBTITLE_FONTS = ['arialbd.ttf', 'Arial Bold.ttf', 'DejaVuSans-Bold.ttf']  # first one Pillow finds is used
+SUBTITLE_FONT_SIZE = 70
+SUBTITLE_STROKE_WIDTH = 2
+SUBTITLE_MARGIN = 50  # pixels kept clear either side of a caption line
+
+# Render Profiles - a quick 'draft' for review, then the 'final' encode once approved
+RENDER_PROFILES = {
+    'draft': {'width': 854, 'height': 480, 'fps': 24, 'preset': 'ultrafast'},
+    'final': {'width': VIDEO_WIDTH, 'height': VIDEO_HEIGHT, 'fps': VIDEO_FPS, 'preset': 'medium'},
+}
+REVIEW_DRAFTS = True  # render a draft and hold the final encode and upload until approved
+
+# HTTP Settings
+HTTP_TIMEOUT = 120  # seconds per request
+ASYNC_MAX_CONNECTIONS = 50  # pooled connections for the async pipeline
+HTTP_POOL_SIZE = 20  # pooled connections per host for the sync downloader
+DOWNLOAD_CONNECT_TIMEOUT = 10  # seconds to connect
+DOWNLOAD_READ_TIMEOUT = 60  # seconds without a byte before a download counts as stalled
+DOWNLOAD_RETRIES = 4  # retries after connection errors, stalls and 5xx (GETs resume)
+DOWNLOAD_BACKOFF = 1  # seconds before the first retry, doubling after each
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read into memory at a time
+
+# Voiceover Settings
+STREAM_SCRIPT_AUDIO = False  # start voicing sentences while the script is still being written
+TTS_WORKERS = 4  # sentences voiced at once per voiceover
+TTS_SENTENCE_GAP = 0.35  # seconds of silence between sentences
+TTS_CACHE_DIR = 'cache/tts'  # sentence audio keyed by provider, voice, settings and text
+TTS_CACHE_MAX_MB = 1000
+
+# Pipeline Settings
+PIPELINE_STAGE_WORKERS = 3  # stages of one video that may run at once
+BATCH_API_WORKERS = 4  # API-bound stages running at once across a batch
+BATCH_RENDER_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # render processes
+
+# LLM Response Cache
+LLM_CACHE_MODE = os.getenv('LLM_CACHE_MODE', 'on')  # on, off, replay (recorded responses only, no network)
+LLM_CACHE_DIR = 'cache/llm'
+LLM_CACHE_MAX_MB = 200  # least recently used responses are evicted beyond this
+
+# Footage Library
+FOOTAGE_DIR = 'cache/footage'  # stock clips stored by asset id, shared by every render
+FOOTAGE_CACHE_MAX_MB = 5000  # least recently used clips are evicted beyond this
+FOOTAGE_SEARCH_TTL_HOURS = 24  # cached search results are re-queried after this long
+FOOTAGE_PARTIAL_MARGIN = 2  # extra seconds kept when only the start of a clip is downloaded
+FOOTAGE_PROXY_CRF = 18  # quality of the render-ready proxies clips are transcoded to on ingest
+FOOTAGE_PROXY_PRESET = 'veryfast'
+FOOTAGE_PROXY_KEYINT = 1  # seconds between proxy keyframes, so cuts land close to where asked
+
+# Topic Inventory
+TOPIC_REFILL_BATCH = 20  # ideas generated per refill call
+TOPIC_INVENTORY_MIN = 5  # refill in the background below this many unused ideas
+TOPIC_TTL_HOURS = 72  # unused ideas expire after this long
+
+# Duplicate Detection - estimated Jaccard similarity (0-1) of word shingles
+# at which a new topic or script counts as a repeat of an earlier video
+SIMILARITY_TOPIC_THRESHOLD = 0.6
+SIMILARITY_SCRIPT_THRESHOLD = 0.5
+SIMILARITY_RETRIES = 2  # fresh topics/scripts tried before giving up on a duplicate
 
 # Paths
 OUTPUT_DIR = 'output'
@@ -28,5 +91,32 @@ AUDIO_DIR = f'{OUTPUT_DIR}/audio'
 VIDEO_DIR = f'{OUTPUT_DIR}/videos'
 THUMBNAILS_DIR = f'{OUTPUT_DIR}/thumbnails'
 
+# Rate Limits - units per minute for a provider (model None) or one of its
+# models; a call must fit both. Limits apply per process.
+RATE_LIMITS = {
+    ('openai', None): {'requests': 500},
+    ('openai', 'gpt-4o'): {'requests': 500, 'tokens': 30000},
+    ('openai', 'gpt-4o-mini'): {'requests': 500, 'tokens': 200000},
+    ('openai', 'tts-1-hd'): {'requests': 500},  # tier 1; voiceovers send one request per sentence
+    ('elevenlabs', None): {'requests': 300, 'chars': 100000},  # paid plans cap concurrency, not requests/min
+    ('pexels', None): {'requests': 3},  # 200 per hour
+}
+RATE_LIMIT_RETRIES = 4  # retries of a call answered with 429
+RATE_LIMIT_BACKOFF = 2  # seconds, doubled per retry, when no Retry-After is sent
+
+# Metrics
+METRICS_WINDOW_SECONDS = 3600  # rolling window for /metrics latency stats
+METRICS_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]  # seconds
+
+# Job Queue
+WORKER_CONCURRENCY = 2  # pipeline jobs one worker command runs at once
+JOB_LEASE_SECONDS = 120  # a job is re-queued if its worker misses heartbeats this long
+JOB_HEARTBEAT_INTERVAL = 20
+JOB_POLL_INTERVAL = 2
+JOB_MAX_ATTEMPTS = 3  # claims before a job is marked dead
+
 # Database
 DB_PATH = 'automation.db'
+DB_BUSY_TIMEOUT = 30  # seconds a writer waits on a locked database
+LOG_BATCH_SIZE = 50  # buffered stage_logs rows per write
+LOG_FLUSH_INTERVAL = 1.0  # max seconds a stage log waits in memory
@@ -1,8 +1,9 @@
+import json
+import threading
 import requests
-from openai import OpenAI
 import config
-
-client = OpenAI(api_key=config.OPENAI_API_KEY)
+import database
+import llm
 
 TOPICS = [
     "self-development", "personal growth", "communication skills",
@@ -10,50 +11,157 @@ TOPICS = [
     "mindset", "habits", "success", "confidence"
 ]
 
-def search_trending_topics():
-    """Use AI to generate trending topic ideas based on current themes"""
-    prompt = f"""You are a content strategist for a motivational YouTube channel.
+def trending_prompt(count=5, categories=None):
+    return f"""You are a content strategist for a motivational YouTube channel.
     
-Generate 5 trending video topic ideas in these categories: {', '.join(TOPICS)}.
+Generate {count} trending video topic ideas in these categories: {', '.join(categories or TOPICS)}.
 
 For each topic, provide:
 1. Core idea (one sentence)
 2. Why it's trending
 3. Target audience pain point
+4. Viral potential for a 60-second motivational video, scored 1-10
 
-Format as JSON array with keys: idea, trend_reason, pain_point"""
+Format as JSON array with keys: idea, trend_reason, pain_point, score"""
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.8
-    )
-    
-    return response.choices[0].message.content
+def select_prompt(topics_json):
+    return f"""From these topics, select the ONE with highest viral potential for a 60-second motivational video:
+
+{topics_json}
+
+Return only the core idea as a single sentence."""
+
+def search_trending_topics(count=5, categories=None):
+    """Use AI to generate trending topic ideas based on current themes"""
+    # Fresh ideas each refill: not served from the cache, only recorded for replay
+    return llm.complete("gpt-4o-mini", llm.user(trending_prompt(count, categories)), temperature=0.8,
+                        completion_tokens=200 * count, cache=False)
 
 def select_best_topic(topics_json):
     """Select the most promising topic"""
-    prompt = f"""From these topics, select the ONE with highest viral potential for a 60-second motivational video:
+    topic = llm.complete("gpt-4o-mini", llm.user(select_prompt(topics_json)), temperature=0.3,
+                         completion_tokens=100)
+    return topic.strip()
 
-{topics_json}
+def parse_ideas(raw):
+    """Parse the idea list from the model's JSON reply; [] if it is not usable"""
+    text = raw.strip()
+    if text.startswith('```'):
+        text = text.strip('`')
+        text = text[text.find('['):]
+    try:
+        ideas = json.loads(text)
+    except json.JSONDecodeError:
+        return []
+    result = []
+    for idea in ideas if isinstance(ideas, list) else []:
+        if isinstance(idea, dict) and idea.get('idea'):
+            try:
+                idea['score'] = float(idea.get('score') or 0)
+            except (TypeError, ValueError):
+                idea['score'] = 0
+            result.append(idea)
+    return result
 
-Return only the core idea as a single sentence."""
+def channel_categories(channel_id):
+    """The channel's niche and the categories to generate ideas for"""
+    row = database.get_channel(channel_id)
+    niche = row[2] if row else None
+    # The default channel's 'General' niche means the stock motivational topics
+    if not niche or niche == 'General':
+        return niche, TOPICS
+    return niche, [niche]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    
-    return response.choices[0].message.content.strip()
+def stock_ideas(channel_id, niche, raw):
+    ideas = parse_ideas(raw)
+    added = database.add_topic_ideas(channel_id, niche, ideas, config.TOPIC_TTL_HOURS * 3600)
+    print(f"✓ Stocked {added} new topic ideas for channel {channel_id}")
+    return ideas
+
+def refill_inventory(channel_id):
+    """Generate a batch of ideas for the channel and add them to its inventory"""
+    niche, categories = channel_categories(channel_id)
+    raw = search_trending_topics(config.TOPIC_REFILL_BATCH, categories)
+    return stock_ideas(channel_id, niche, raw)
 
-def source_content():
+async def refill_inventory_async(channel_id):
+    """refill_inventory() on the shared async OpenAI client"""
+    niche, categories = channel_categories(channel_id)
+    raw = await search_trending_topics_async(config.TOPIC_REFILL_BATCH, categories)
+    return stock_ideas(channel_id, niche, raw)
+
+_refilling = set()
+_refill_lock = threading.Lock()
+
+def refill_in_background(channel_id):
+    """Start a refill thread for the channel unless one is already running"""
+    with _refill_lock:
+        if channel_id in _refilling:
+            return
+        _refilling.add(channel_id)
+
+    def run():
+        try:
+            refill_inventory(channel_id)
+        except Exception as e:
+            print(f"⚠️  Topic inventory refill failed for channel {channel_id}: {e}")
+        finally:
+            database.close_connection()
+            with _refill_lock:
+                _refilling.discard(channel_id)
+
+    threading.Thread(target=run, daemon=True).start()
+
+def take_idea(channel_id):
+    """Serve the best stocked idea, topping up the inventory in the background when low"""
+    idea = database.claim_topic_idea(channel_id)
+    if idea and database.count_topic_ideas(channel_id) < config.TOPIC_INVENTORY_MIN:
+        refill_in_background(channel_id)
+    return idea
+
+def source_content(channel_id=1):
     """Main function to source trending content"""
     print("🔍 Sourcing trending topics...")
-    topics = search_trending_topics()
-    print(f"✓ Found trending topics")
+    database.expire_topic_ideas()
+    idea = take_idea(channel_id)
+    if not idea:
+        # Empty inventory: refill inline, then serve from it
+        print("🔍 Topic inventory empty, generating ideas...")
+        refill_inventory(channel_id)
+        idea = take_idea(channel_id)
+    if not idea:
+        # The batch reply could not be parsed; fall back to picking one directly
+        best_topic = select_best_topic(search_trending_topics())
+    else:
+        best_topic = idea['idea']
+    print(f"✓ Selected topic: {best_topic}")
     
-    best_topic = select_best_topic(topics)
+    return best_topic
+
+async def search_trending_topics_async(count=5, categories=None):
+    """search_trending_topics() on the shared async OpenAI client"""
+    return await llm.complete_async("gpt-4o-mini", llm.user(trending_prompt(count, categories)),
+                                    temperature=0.8, completion_tokens=200 * count, cache=False)
+
+async def select_best_topic_async(topics_json):
+    """select_best_topic() on the shared async OpenAI client"""
+    topic = await llm.complete_async("gpt-4o-mini", llm.user(select_prompt(topics_json)),
+                                     temperature=0.3, completion_tokens=100)
+    return topic.strip()
+
+async def source_content_async(channel_id=1):
+    """Async counterpart of source_content()"""
+    print("🔍 Sourcing trending topics...")
+    database.expire_topic_ideas()
+    idea = take_idea(channel_id)
+    if not idea:
+        print("🔍 Topic inventory empty, generating ideas...")
+        await refill_inventory_async(channel_id)
+        idea = take_idea(channel_id)
+    if not idea:
+        best_topic = await select_best_topic_async(await search_trending_topics_async())
+    else:
+        best_topic = idea['idea']
     print(f"✓ Selected topic: {best_topic}")
     
     return best_topic
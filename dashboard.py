@@ -1,8 +1,11 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
 import database
-import pipeline
-import threading
+import footage_library
+import job_queue
+import metrics
+import config
 import json
+import time
 
 app = Flask(__name__)
 
@@ -12,28 +15,34 @@ def index():
 
 @app.route('/api/videos')
 def get_videos():
-    videos = database.get_all_videos()
-    columns = ['id', 'channel_id', 'topic', 'content_source', 'script', 'audio_path', 'video_path', 
-               'thumbnail_path', 'title', 'description', 'tags', 'status', 'stage', 'stage_progress',
-               'requires_review', 'approved', 'scheduled_time', 'youtube_id', 'views', 'ctr', 
-               'retention', 'created_at', 'uploaded_at', 'error_log']
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    columns = request.args.get('columns')
+    if columns == 'all':
+        columns = database.VIDEO_COLUMNS
+    elif columns:
+        columns = columns.split(',')
     
-    videos_list = []
-    for video in videos:
-        video_dict = dict(zip(columns, video))
-        videos_list.append(video_dict)
+    try:
+        videos, next_cursor = database.get_videos_page(
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            channel_id=request.args.get('channel_id', type=int),
+            status=request.args.get('status'),
+            stage=request.args.get('stage'),
+            columns=columns
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify(videos_list)
+    return jsonify({'videos': videos, 'next_cursor': next_cursor})
 
 @app.route('/api/video/<int:video_id>')
 def get_video(video_id):
     video = database.get_video(video_id)
     if video:
-        columns = ['id', 'channel_id', 'topic', 'content_source', 'script', 'audio_path', 'video_path',
-                   'thumbnail_path', 'title', 'description', 'tags', 'status', 'stage', 'stage_progress',
-                   'requires_review', 'approved', 'scheduled_time', 'youtube_id', 'views', 'ctr',
-                   'retention', 'created_at', 'uploaded_at', 'error_log']
-        return jsonify(dict(zip(columns, video)))
+        video_dict = dict(zip(database.VIDEO_COLUMNS, video))
+        video_dict['timings'] = metrics.video_timings(video_id)
+        return jsonify(video_dict)
     return jsonify({'error': 'Video not found'}), 404
 
 @app.route('/api/video/<int:video_id>/logs')
@@ -50,13 +59,33 @@ def create_video():
     content_source = data.get('content_source', 'trending')
     custom_topic = data.get('topic')
     
-    def run_async():
-        pipeline.run_pipeline(channel_id, content_source, custom_topic)
+    job_id = job_queue.enqueue('create', {
+        'channel_id': channel_id,
+        'content_source': content_source,
+        'topic': custom_topic,
+        'render_backend': data.get('render_backend')
+    })
     
-    thread = threading.Thread(target=run_async)
-    thread.start()
+    return jsonify({'status': 'queued', 'job_id': job_id,
+                    'message': f'Video creation queued (job {job_id})'})
+
+@app.route('/api/video/<int:video_id>/resume', methods=['POST'])
+def resume_video(video_id):
+    if not database.get_video(video_id):
+        return jsonify({'error': 'Video not found'}), 404
     
-    return jsonify({'status': 'started', 'message': 'Video creation pipeline started'})
+    job_id = job_queue.enqueue('resume', {'video_id': video_id})
+    return jsonify({'status': 'queued', 'job_id': job_id,
+                    'message': f'Resume of video {video_id} queued (job {job_id})'})
+
+@app.route('/api/jobs')
+def get_jobs():
+    status = request.args.get('status')
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    return jsonify({
+        'counts': job_queue.job_counts(),
+        'jobs': job_queue.list_jobs(status, limit)
+    })
 
 @app.route('/api/update/<int:video_id>', methods=['POST'])
 def update_video(video_id):
@@ -66,30 +95,36 @@ def update_video(video_id):
 
 @app.route('/api/approve/<int:video_id>', methods=['POST'])
 def approve_video(video_id):
+    row = database.get_video(video_id)
+    if not row:
+        return jsonify({'error': 'Video not found'}), 404
     database.update_video(video_id, approved=1, requires_review=0)
-    return jsonify({'status': 'approved'})
+    
+    # A draft parked for review continues with its final render
+    if dict(zip(database.VIDEO_COLUMNS, row))['status'] == 'review':
+        job_id = job_queue.enqueue('resume', {'video_id': video_id})
+        return jsonify({'status': 'approved', 'job_id': job_id,
+                        'message': f'Approved; final render of video {video_id} queued (job {job_id})'})
+    return jsonify({'status': 'approved', 'message': f'Video {video_id} approved'})
 
 @app.route('/api/stats')
 def get_stats():
-    videos = database.get_all_videos()
-    
-    # Column indices: 0=id, 1=channel_id, 2=topic, 3=content_source, 4=script, 5=audio_path, 
-    # 6=video_path, 7=thumbnail_path, 8=title, 9=description, 10=tags, 11=status, 12=stage, 
-    # 13=stage_progress, 14=requires_review, 15=approved, 16=scheduled_time, 17=youtube_id, 
-    # 18=views, 19=ctr, 20=retention, 21=created_at, 22=uploaded_at, 23=error_log
-    
-    stats = {
-        'total_videos': len(videos),
-        'pending': len([v for v in videos if v[11] == 'pending']),
-        'ready': len([v for v in videos if v[11] == 'ready']),
-        'uploaded': len([v for v in videos if v[11] == 'uploaded']),
-        'failed': len([v for v in videos if v[11] == 'failed']),
-        'total_views': sum([v[18] or 0 for v in videos]),
-        'avg_ctr': sum([v[19] or 0 for v in videos]) / len(videos) if videos else 0,
-        'avg_retention': sum([v[20] or 0 for v in videos]) / len(videos) if videos else 0
-    }
-    
-    return jsonify(stats)
+    channel_id = request.args.get('channel_id', type=int)
+    return jsonify(database.get_video_stats(channel_id))
+
+@app.route('/metrics')
+def get_metrics():
+    jobs = [({'status': status}, count) for status, count in job_queue.job_counts().items()]
+    since = time.time() - config.JOB_LEASE_SECONDS
+    waiting = [({'provider': provider, 'model': model}, count)
+               for provider, model, count in database.get_rate_limit_waiting(since)]
+    footage = [({'stat': stat}, value) for stat, value in footage_library.stats().items()]
+    text = metrics.prometheus_text([
+        ('pipeline_jobs', 'Jobs in the queue by status', jobs),
+        ('rate_limit_queue_depth', 'Calls waiting for rate limit capacity', waiting),
+        ('footage_library', 'Footage library hits, misses and size', footage),
+    ])
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/channels')
 def get_channels():
@@ -110,6 +145,7 @@ if __name__ == '__main__':
     print("🎬 YouTube Automation Dashboard")
     print("="*60)
     print("Dashboard running at: http://localhost:5001")
+    print("Start workers with: python worker.py")
     print("Press CTRL+C to stop")
     print("="*60 + "\n")
     app.run(host='0.0.0.0', port=5001, debug=False)
@@ -1,11 +1,172 @@
+import atexit
+import json
+import os
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import config
 
-def init_db():
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
+# One connection per thread, reused across helpers. sqlite3 keeps a per-connection
+# cache of compiled statements, so the fixed SQL below is prepared only once.
+_local = threading.local()
+
+def get_connection():
+    """Return this thread's connection, opening and tuning it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == config.DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    
+    conn = sqlite3.connect(config.DB_PATH, timeout=config.DB_BUSY_TIMEOUT,
+                           isolation_level=None, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT * 1000)}')
+    _local.conn = conn
+    _local.path = config.DB_PATH
+    _local.depth = 0
+    return conn
+
+def close_connection():
+    """Close this thread's connection (call when a worker thread is done)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """Group several helper calls into one atomic commit.
+    
+    Nested uses join the outermost transaction, so helpers called inside
+    a `with transaction():` block commit together with it.
+    """
+    conn = get_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn.cursor()
+        finally:
+            _local.depth -= 1
+        return
+    
+    conn.execute('BEGIN IMMEDIATE')
+    _local.depth = 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        _local.depth = 0
+        conn.execute('ROLLBACK')
+        raise
+    _local.depth = 0
+    conn.execute('COMMIT')
+
+class BatchWriter:
+    """Background sink that batches inserts (stage_logs, spans) off the caller's thread.
+    
+    Rows are queued in memory and written in one transaction when the batch
+    fills up or the flush interval elapses, whichever comes first.
+    """
+    
+    def __init__(self, insert_sql, name, batch_size=None, flush_interval=None):
+        self.insert_sql = insert_sql
+        self.name = name
+        self.batch_size = batch_size or config.LOG_BATCH_SIZE
+        self.flush_interval = flush_interval or config.LOG_FLUSH_INTERVAL
+        self._pending = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+    
+    def write(self, row):
+        with self._cond:
+            self._pending.append(row)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+    
+    def flush(self):
+        """Write every queued row now; returns how many were written"""
+        with self._write_lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if rows:
+                try:
+                    with transaction() as c:
+                        c.executemany(self.insert_sql, rows)
+                except sqlite3.Error:
+                    # Back to the front of the queue, so the next flush retries them in order
+                    with self._cond:
+                        self._pending[:0] = rows
+                    raise
+            return len(rows)
+    
+    def reset(self):
+        """Drop state inherited across fork(); the parent still owns those rows"""
+        self._pending = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
     
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️  {self.name} flush failed, will retry: {e}")
+
+_log_writer = BatchWriter('''INSERT INTO stage_logs (video_id, stage, status, message, timestamp)
+                             VALUES (?, ?, ?, ?, ?)''', 'stage-log-writer')
+_span_writer = BatchWriter('''INSERT INTO spans (video_id, kind, name, provider, model, started_at,
+                                                 duration_ms, bytes, tokens, outcome)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', 'span-writer')
+
+def flush_logs():
+    """Persist all buffered stage logs and spans (pipeline end, shutdown)"""
+    return _log_writer.flush() + _span_writer.flush()
+
+def _after_fork():
+    global _local
+    _local = threading.local()
+    _log_writer.reset()
+    _span_writer.reset()
+
+atexit.register(flush_logs)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+VIDEO_COLUMNS = ['id', 'channel_id', 'topic', 'content_source', 'script', 'audio_path', 'video_path',
+                 'thumbnail_path', 'title', 'description', 'tags', 'status', 'stage', 'stage_progress',
+                 'requires_review', 'approved', 'scheduled_time', 'youtube_id', 'views', 'ctr',
+                 'retention', 'created_at', 'uploaded_at', 'error_log']
+
+# Cheap stand-ins for the large text columns, for list views
+VIDEO_DERIVED_COLUMNS = {
+    'has_script': "script IS NOT NULL AND script != ''",
+    'error_summary': 'substr(error_log, 1, 200)',
+}
+
+VIDEO_SUMMARY_COLUMNS = ['id', 'channel_id', 'topic', 'content_source', 'title', 'video_path',
+                         'status', 'stage', 'stage_progress', 'requires_review', 'approved',
+                         'scheduled_time', 'views', 'created_at', 'has_script', 'error_summary']
+
+def _query(sql, params=(), one=False):
+    c = get_connection().execute(sql, params)
+    return c.fetchone() if one else c.fetchall()
+
+def init_db():
+    with transaction() as c:
+        _create_schema(c)
+
+def _create_schema(c):
     # Channels table
     c.execute('''CREATE TABLE IF NOT EXISTS channels (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -57,6 +218,134 @@ def init_db():
         FOREIGN KEY (video_id) REFERENCES videos(id)
     )''')
     
+    # Stage outputs of each video, so a failed run can resume where it stopped
+    c.execute('''CREATE TABLE IF NOT EXISTS stage_checkpoints (
+        video_id INTEGER,
+        stage TEXT,
+        output TEXT,
+        completed_at TEXT,
+        PRIMARY KEY (video_id, stage),
+        FOREIGN KEY (video_id) REFERENCES videos(id)
+    )''')
+    
+    # Timing spans for stages and outbound calls (durations in ms)
+    c.execute('''CREATE TABLE IF NOT EXISTS spans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_id INTEGER,
+        kind TEXT,
+        name TEXT,
+        provider TEXT,
+        model TEXT,
+        started_at REAL,
+        duration_ms REAL,
+        bytes INTEGER,
+        tokens INTEGER,
+        outcome TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_spans_started ON spans(started_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_spans_video ON spans(video_id)')
+    
+    # Calls waiting on a rate limiter, per process, for /metrics
+    c.execute('''CREATE TABLE IF NOT EXISTS rate_limit_queue (
+        process TEXT,
+        provider TEXT,
+        model TEXT,
+        waiting INTEGER,
+        updated_at REAL,
+        PRIMARY KEY (process, provider, model)
+    )''')
+    
+    # Durable pipeline job queue; workers hold a lease they renew by heartbeat
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        payload TEXT,
+        status TEXT DEFAULT 'queued',
+        attempts INTEGER DEFAULT 0,
+        max_attempts INTEGER DEFAULT 3,
+        worker_id TEXT,
+        lease_expires_at REAL,
+        heartbeat_at REAL,
+        video_id INTEGER,
+        error TEXT,
+        created_at TEXT,
+        started_at TEXT,
+        finished_at TEXT
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)')
+    
+    # Per-channel, per-status aggregates kept current by add_video/update_video
+    c.execute('''CREATE TABLE IF NOT EXISTS video_stats (
+        channel_id INTEGER,
+        status TEXT,
+        videos INTEGER DEFAULT 0,
+        views INTEGER DEFAULT 0,
+        ctr_sum REAL DEFAULT 0,
+        retention_sum REAL DEFAULT 0,
+        PRIMARY KEY (channel_id, status)
+    )''')
+    
+    # Generated topic ideas per channel, served best-first until used or expired
+    c.execute('''CREATE TABLE IF NOT EXISTS topic_inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel_id INTEGER,
+        niche TEXT,
+        idea TEXT,
+        trend_reason TEXT,
+        pain_point TEXT,
+        score REAL,
+        created_at TEXT,
+        expires_at REAL,
+        used_at TEXT,
+        UNIQUE (channel_id, idea)
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_topic_inventory_available ON topic_inventory(channel_id, used_at, score)')
+    
+    # MinHash signatures of video topics and scripts; seq orders additions so
+    # each process's in-memory similarity index can catch up incrementally
+    c.execute('''CREATE TABLE IF NOT EXISTS content_signatures (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_id INTEGER,
+        kind TEXT,
+        signature BLOB,
+        UNIQUE (video_id, kind)
+    )''')
+    
+    # Measured voiceover lengths, for calibrating script duration predictions
+    c.execute('''CREATE TABLE IF NOT EXISTS voice_durations (
+        video_id INTEGER,
+        voice TEXT,
+        words INTEGER,
+        stops INTEGER,
+        commas INTEGER,
+        seconds REAL,
+        created_at TEXT,
+        PRIMARY KEY (video_id, voice)
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_voice_durations_voice ON voice_durations(voice, created_at)')
+    
+    # Stock footage search results (JSON asset lists) per normalized query
+    c.execute('''CREATE TABLE IF NOT EXISTS footage_searches (
+        query TEXT,
+        per_page INTEGER,
+        results TEXT,
+        fetched_at REAL,
+        PRIMARY KEY (query, per_page)
+    )''')
+    
+    # Footage library hit/miss counters, shared by every process
+    c.execute('''CREATE TABLE IF NOT EXISTS footage_stats (
+        event TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    )''')
+    
+    # Indexes for the newest-first listings and per-video log lookups
+    c.execute('CREATE INDEX IF NOT EXISTS idx_videos_created ON videos(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_videos_channel_created ON videos(channel_id, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_videos_status_created ON videos(status, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_videos_stage_created ON videos(stage, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_stage_logs_video_time ON stage_logs(video_id, timestamp)')
+    
     # Insert default channel if none exists
     c.execute('SELECT COUNT(*) FROM channels')
     if c.fetchone()[0] == 0:
@@ -64,88 +353,309 @@ def init_db():
                      VALUES (?, ?, ?, ?)''', 
                   ('Main Channel', 'General', 'active', datetime.now().isoformat()))
     
-    conn.commit()
-    conn.close()
+    # Backfill aggregates for databases created before video_stats existed
+    c.execute('SELECT EXISTS (SELECT 1 FROM video_stats)')
+    if not c.fetchone()[0]:
+        _rebuild_video_stats(c)
+
+# Columns that feed video_stats; updates touching them adjust the aggregates
+STATS_FIELDS = {'channel_id', 'status', 'views', 'ctr', 'retention'}
+
+def _bump_stats(c, row, sign):
+    """Add (sign=1) or remove (sign=-1) one video's contribution to video_stats"""
+    channel_id, status, views, ctr, retention = row
+    c.execute('''INSERT INTO video_stats (channel_id, status, videos, views, ctr_sum, retention_sum)
+                 VALUES (?, ?, ?, ?, ?, ?)
+                 ON CONFLICT (channel_id, status) DO UPDATE SET
+                     videos = videos + excluded.videos,
+                     views = views + excluded.views,
+                     ctr_sum = ctr_sum + excluded.ctr_sum,
+                     retention_sum = retention_sum + excluded.retention_sum''',
+              (channel_id, status, sign, sign * (views or 0),
+               sign * (ctr or 0), sign * (retention or 0)))
+
+def _stats_row(c, video_id):
+    c.execute('SELECT channel_id, status, views, ctr, retention FROM videos WHERE id=?', (video_id,))
+    return c.fetchone()
 
 def add_video(topic, channel_id=1, content_source='trending', stage='sourcing'):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('''INSERT INTO videos (channel_id, topic, content_source, stage, status, created_at) 
-                 VALUES (?, ?, ?, ?, 'pending', ?)''', 
-              (channel_id, topic, content_source, stage, datetime.now().isoformat()))
-    video_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    
-    # Log after committing
-    log_stage(video_id, stage, 'started', f'Video creation started with topic: {topic}')
+    with transaction() as c:
+        c.execute('''INSERT INTO videos (channel_id, topic, content_source, stage, status, created_at) 
+                     VALUES (?, ?, ?, ?, 'pending', ?)''', 
+                  (channel_id, topic, content_source, stage, datetime.now().isoformat()))
+        video_id = c.lastrowid
+        _bump_stats(c, (channel_id, 'pending', 0, 0, 0), 1)
+        log_stage(video_id, stage, 'started', f'Video creation started with topic: {topic}')
     return video_id
 
 def update_video(video_id, **kwargs):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
     fields = ', '.join([f'{k}=?' for k in kwargs.keys()])
     values = list(kwargs.values()) + [video_id]
-    c.execute(f'UPDATE videos SET {fields} WHERE id=?', values)
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        if STATS_FIELDS.isdisjoint(kwargs):
+            c.execute(f'UPDATE videos SET {fields} WHERE id=?', values)
+            return
+        old = _stats_row(c, video_id)
+        c.execute(f'UPDATE videos SET {fields} WHERE id=?', values)
+        if old:
+            _bump_stats(c, old, -1)
+            _bump_stats(c, _stats_row(c, video_id), 1)
 
 def get_video(video_id):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM videos WHERE id=?', (video_id,))
-    row = c.fetchone()
-    conn.close()
-    return row
+    return _query('SELECT * FROM videos WHERE id=?', (video_id,), one=True)
 
 def get_all_videos():
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM videos ORDER BY created_at DESC')
-    rows = c.fetchall()
-    conn.close()
-    return rows
-
-def log_stage(video_id, stage, status, message):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('''INSERT INTO stage_logs (video_id, stage, status, message, timestamp)
-                 VALUES (?, ?, ?, ?, ?)''',
-              (video_id, stage, status, message, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+    return _query('SELECT * FROM videos ORDER BY created_at DESC')
+
+def get_videos_page(limit=20, cursor=None, channel_id=None, status=None, stage=None, columns=None):
+    """Return one page of videos, newest first, as (rows, next_cursor).
+    
+    Rows are dicts holding `columns` (default: VIDEO_SUMMARY_COLUMNS). Pass
+    next_cursor back in to get the following page; it is None on the last page.
+    """
+    if limit < 1:
+        raise ValueError(f'Invalid limit: {limit}')
+    columns = columns or VIDEO_SUMMARY_COLUMNS
+    select = []
+    for col in columns:
+        if col in VIDEO_DERIVED_COLUMNS:
+            select.append(f'{VIDEO_DERIVED_COLUMNS[col]} AS {col}')
+        elif col in VIDEO_COLUMNS:
+            select.append(col)
+        else:
+            raise ValueError(f'Unknown video column: {col}')
+    # The cursor is built from these, so always fetch them
+    select += ['created_at AS _cursor_created', 'id AS _cursor_id']
+    
+    where, params = [], []
+    for col, value in (('channel_id', channel_id), ('status', status), ('stage', stage)):
+        if value is not None:
+            where.append(f'{col}=?')
+            params.append(value)
+    if cursor:
+        try:
+            created_at, last_id = cursor.rsplit('|', 1)
+            last_id = int(last_id)
+        except ValueError:
+            raise ValueError(f'Invalid cursor: {cursor}')
+        where.append('(created_at, id) < (?, ?)')
+        params += [created_at, last_id]
+    
+    sql = f'SELECT {", ".join(select)} FROM videos'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    rows = _query(sql, params + [limit + 1])
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1][-2]}|{rows[-1][-1]}'
+    return [dict(zip(columns, row)) for row in rows], next_cursor
+
+def log_stage(video_id, stage, status, message, timestamp=None):
+    """Queue a stage log row; it is written by the background log writer"""
+    timestamp = timestamp or datetime.now().isoformat()
+    _log_writer.write((video_id, stage, status, message, timestamp))
+
+def record_span(video_id, kind, name, provider, model, started_at, duration_ms,
+                nbytes=None, tokens=None, outcome='ok'):
+    """Queue a timing span; it is written by the background span writer"""
+    _span_writer.write((video_id, kind, name, provider, model, started_at,
+                        round(duration_ms, 1), nbytes, tokens, outcome))
+
+def get_spans(video_id):
+    flush_logs()
+    return _query('''SELECT kind, name, provider, model, started_at, duration_ms, bytes, tokens, outcome
+                     FROM spans WHERE video_id=? ORDER BY started_at''', (video_id,))
+
+def get_recent_spans(since):
+    """Spans started after `since` (epoch seconds), for rolling latency stats"""
+    return _query('''SELECT kind, name, provider, duration_ms, outcome, tokens, bytes
+                     FROM spans WHERE started_at >= ?''', (since,))
+
+def set_rate_limit_waiting(process, provider, model, waiting):
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO rate_limit_queue (process, provider, model, waiting, updated_at)
+                     VALUES (?, ?, ?, ?, ?)''',
+                  (process, provider, model or '', waiting, time.time()))
+
+def get_rate_limit_waiting(since):
+    """Waiting calls per (provider, model) across processes that reported after `since`"""
+    return _query('''SELECT provider, model, SUM(waiting) FROM rate_limit_queue
+                     WHERE updated_at >= ? GROUP BY provider, model''', (since,))
 
 def get_stage_logs(video_id):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM stage_logs WHERE video_id=? ORDER BY timestamp DESC', (video_id,))
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    flush_logs()
+    return _query('SELECT * FROM stage_logs WHERE video_id=? ORDER BY timestamp DESC', (video_id,))
+
+def save_checkpoint(video_id, stage, output):
+    """Record a completed stage and its outputs (JSON-serializable dict)"""
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO stage_checkpoints (video_id, stage, output, completed_at)
+                     VALUES (?, ?, ?, ?)''',
+                  (video_id, stage, json.dumps(output, default=str), datetime.now().isoformat()))
+
+def get_checkpoints(video_id):
+    """Return {stage: output} for every completed stage of a video"""
+    rows = _query('SELECT stage, output FROM stage_checkpoints WHERE video_id=?', (video_id,))
+    return {stage: json.loads(output) for stage, output in rows}
+
+def clear_checkpoints(video_id, stages):
+    with transaction() as c:
+        c.executemany('DELETE FROM stage_checkpoints WHERE video_id=? AND stage=?',
+                      [(video_id, stage) for stage in stages])
+
+TOPIC_COLUMNS = ['id', 'channel_id', 'niche', 'idea', 'trend_reason', 'pain_point',
+                 'score', 'created_at', 'expires_at', 'used_at']
+
+def add_topic_ideas(channel_id, niche, ideas, ttl_seconds):
+    """Stock ideas (dicts with idea, trend_reason, pain_point, score); returns how many were new"""
+    created_at = datetime.now().isoformat()
+    expires_at = time.time() + ttl_seconds
+    with transaction() as c:
+        added = 0
+        for idea in ideas:
+            c.execute('''INSERT OR IGNORE INTO topic_inventory
+                         (channel_id, niche, idea, trend_reason, pain_point, score, created_at, expires_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (channel_id, niche, idea['idea'], idea.get('trend_reason'),
+                       idea.get('pain_point'), idea.get('score', 0), created_at, expires_at))
+            added += c.rowcount
+    return added
+
+def claim_topic_idea(channel_id):
+    """Mark the channel's best unused, unexpired idea as used and return it (or None)"""
+    with transaction() as c:
+        c.execute('''SELECT * FROM topic_inventory
+                     WHERE channel_id=? AND used_at IS NULL AND expires_at > ?
+                     ORDER BY score DESC, id LIMIT 1''', (channel_id, time.time()))
+        row = c.fetchone()
+        if not row:
+            return None
+        c.execute('UPDATE topic_inventory SET used_at=? WHERE id=?',
+                  (datetime.now().isoformat(), row[0]))
+    return dict(zip(TOPIC_COLUMNS, row))
+
+def count_topic_ideas(channel_id):
+    """Unused, unexpired ideas in stock for a channel"""
+    return _query('''SELECT COUNT(*) FROM topic_inventory
+                     WHERE channel_id=? AND used_at IS NULL AND expires_at > ?''',
+                  (channel_id, time.time()), one=True)[0]
+
+def expire_topic_ideas():
+    """Drop stale unused ideas; used ones stay so they are not stocked again"""
+    with transaction() as c:
+        c.execute('DELETE FROM topic_inventory WHERE used_at IS NULL AND expires_at <= ?', (time.time(),))
+        return c.rowcount
+
+def add_content_signatures(kind, signatures):
+    """Store (video_id, signature bytes) pairs, replacing a video's earlier signature"""
+    with transaction() as c:
+        c.executemany('''INSERT OR REPLACE INTO content_signatures (video_id, kind, signature)
+                         VALUES (?, ?, ?)''',
+                      [(video_id, kind, sig) for video_id, sig in signatures])
+
+def get_content_signatures(kind, after_seq=0):
+    """(seq, video_id, signature) rows of a kind added after after_seq, in order"""
+    return _query('''SELECT seq, video_id, signature FROM content_signatures
+                     WHERE kind=? AND seq > ? ORDER BY seq''', (kind, after_seq))
+
+def get_max_signature_seq():
+    return _query('SELECT COALESCE(MAX(seq), 0) FROM content_signatures', one=True)[0]
+
+def get_video_texts(column):
+    """(id, text) for every video with a non-empty topic or script"""
+    if column not in ('topic', 'script'):
+        raise ValueError(f"Not a text column: {column}")
+    return _query(f"SELECT id, {column} FROM videos WHERE {column} IS NOT NULL AND {column} != ''")
+
+def add_duration_sample(video_id, voice, words, stops, commas, seconds):
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO voice_durations
+                     (video_id, voice, words, stops, commas, seconds, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (video_id, voice, words, stops, commas, seconds, datetime.now().isoformat()))
+
+def get_duration_samples(voice, limit=200):
+    """Most recent (words, stops, commas, seconds) measurements for a voice"""
+    return _query('''SELECT words, stops, commas, seconds FROM voice_durations
+                     WHERE voice=? ORDER BY created_at DESC LIMIT ?''', (voice, limit))
+
+def get_footage_search(query, per_page, fresh_since):
+    """Cached results JSON for a query fetched after fresh_since, or None"""
+    rows = _query('''SELECT results FROM footage_searches
+                     WHERE query=? AND per_page=? AND fetched_at>?''', (query, per_page, fresh_since))
+    return rows[0][0] if rows else None
+
+def save_footage_search(query, per_page, results):
+    with transaction() as c:
+        c.execute('''INSERT OR REPLACE INTO footage_searches (query, per_page, results, fetched_at)
+                     VALUES (?, ?, ?, ?)''', (query, per_page, results, time.time()))
+
+def count_footage_event(event, n=1):
+    with transaction() as c:
+        c.execute('''INSERT INTO footage_stats (event, count) VALUES (?, ?)
+                     ON CONFLICT (event) DO UPDATE SET count = count + excluded.count''', (event, n))
+
+def get_footage_stats():
+    return dict(_query('SELECT event, count FROM footage_stats'))
 
 def add_channel(name, niche):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('''INSERT INTO channels (name, niche, status, created_at)
-                 VALUES (?, ?, 'active', ?)''',
-              (name, niche, datetime.now().isoformat()))
-    channel_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''INSERT INTO channels (name, niche, status, created_at)
+                     VALUES (?, ?, 'active', ?)''',
+                  (name, niche, datetime.now().isoformat()))
+        channel_id = c.lastrowid
     return channel_id
 
 def get_all_channels():
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM channels ORDER BY created_at DESC')
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return _query('SELECT * FROM channels ORDER BY created_at DESC')
 
 def get_channel(channel_id):
-    conn = sqlite3.connect(config.DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT * FROM channels WHERE id=?', (channel_id,))
-    row = c.fetchone()
-    conn.close()
-    return row
+    return _query('SELECT * FROM channels WHERE id=?', (channel_id,), one=True)
+
+def _rebuild_video_stats(c):
+    c.execute('DELETE FROM video_stats')
+    c.execute('''INSERT INTO video_stats (channel_id, status, videos, views, ctr_sum, retention_sum)
+                 SELECT channel_id, status, COUNT(*), COALESCE(SUM(views), 0),
+                        COALESCE(SUM(ctr), 0), COALESCE(SUM(retention), 0)
+                 FROM videos GROUP BY channel_id, status''')
+
+def rebuild_video_stats():
+    """Recompute video_stats from the videos table"""
+    with transaction() as c:
+        _rebuild_video_stats(c)
+
+def get_video_stats(channel_id=None):
+    """Dashboard totals read from video_stats (optionally for one channel)"""
+    sql = 'SELECT status, SUM(videos), SUM(views), SUM(ctr_sum), SUM(retention_sum) FROM video_stats'
+    params = ()
+    if channel_id is not None:
+        sql += ' WHERE channel_id=?'
+        params = (channel_id,)
+    rows = _query(sql + ' GROUP BY status', params)
+    
+    total = sum(r[1] for r in rows)
+    counts = {r[0]: r[1] for r in rows}
+    return {
+        'total_videos': total,
+        'pending': counts.get('pending', 0),
+        'ready': counts.get('ready', 0),
+        'uploaded': counts.get('uploaded', 0),
+        'failed': counts.get('failed', 0),
+        'total_views': sum(r[2] for r in rows),
+        'avg_ctr': sum(r[3] for r in rows) / total if total else 0,
+        'avg_retention': sum(r[4] for r in rows) / total if total else 0
+    }
+
+if __name__ == "__main__":
+    import sys
+    
+    if sys.argv[1:] == ['rebuild-stats']:
+        init_db()
+        rebuild_video_stats()
+        print("✓ video_stats rebuilt")
+    else:
+        init_db()
+        print(f"✓ Database ready: {config.DB_PATH}")
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+import async_clients
+import config
+import metrics
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+class IncompleteDownload(Exception):
+    """A download that stopped early or hit a server error; retried"""
+
+_session = None
+_session_lock = threading.Lock()
+
+def session():
+    """Process-wide requests.Session with a pooled connection per host"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE)
+            s.mount('https://', adapter)
+            s.mount('http://', adapter)
+            _session = s
+        return _session
+
+def timeout():
+    return (config.DOWNLOAD_CONNECT_TIMEOUT, config.DOWNLOAD_READ_TIMEOUT)
+
+def _after_fork():
+    # The parent's pooled sockets must not be shared with a child process
+    global _session, _session_lock
+    _session = None
+    _session_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _fresh_part(output_path):
+    """Scratch path for a download; a leftover from an earlier call may be another file"""
+    part = f'{output_path}.part'
+    if os.path.exists(part):
+        os.remove(part)
+    return part
+
+def _resume_from(part, method):
+    """Bytes already on disk to resume from; only GETs are resumed"""
+    if method == 'GET' and os.path.exists(part):
+        return os.path.getsize(part)
+    return 0
+
+def _request_headers(headers, offset):
+    headers = dict(headers or {})
+    # Uncompressed, so Range offsets and Content-Length count the bytes on disk
+    headers.setdefault('Accept-Encoding', 'identity')
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+    return headers
+
+def _check_length(part, offset, resumed, expected):
+    """Raise IncompleteDownload if the body came up short of Content-Length"""
+    if expected is None:
+        return
+    got = os.path.getsize(part) - (offset if resumed else 0)
+    if got < int(expected):
+        raise IncompleteDownload(f"got {got} of {expected} bytes")
+
+def _backoff(name, attempt, error):
+    wait = config.DOWNLOAD_BACKOFF * 2 ** attempt
+    print(f"⚠️  {name} interrupted ({error}), retrying in {wait}s")
+    return wait
+
+def download(url, output_path, method='GET', headers=None, name='download', provider=None,
+             model=None, video_id=None, **kwargs):
+    """Stream a response body to output_path in DOWNLOAD_CHUNK_SIZE pieces.
+
+    Writes to output_path + '.part' and renames it into place once complete.
+    Connection errors, stalls and 5xx are retried with backoff, a GET picking
+    up where the previous attempt stopped via a Range request. Other 4xx raise requests.HTTPError
+    straight away (429s are for rate_limiter.call to retry). kwargs go to
+    requests (json, params, ...).
+    """
+    part = _fresh_part(output_path)
+    with metrics.span(name, provider=provider, model=model, video_id=video_id) as span:
+        for attempt in range(config.DOWNLOAD_RETRIES + 1):
+            offset = _resume_from(part, method)
+            try:
+                with session().request(method, url, headers=_request_headers(headers, offset),
+                                       stream=True, timeout=timeout(), **kwargs) as response:
+                    if response.status_code == 416 and offset:
+                        # Range no longer valid for this file: start over
+                        os.remove(part)
+                        raise IncompleteDownload("range not satisfiable")
+                    if response.status_code in RETRY_STATUSES:
+                        raise IncompleteDownload(f"HTTP {response.status_code}")
+                    if response.status_code >= 400:
+                        raise requests.HTTPError(
+                            f"{name} failed ({response.status_code}): {response.text[:500]}",
+                            response=response)
+                    resumed = offset and response.status_code == 206
+                    with open(part, 'ab' if resumed else 'wb') as f:
+                        for chunk in response.iter_content(config.DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                    _check_length(part, offset, resumed, response.headers.get('Content-Length'))
+                os.replace(part, output_path)
+                span['bytes'] = os.path.getsize(output_path)
+                return output_path
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError, IncompleteDownload) as e:
+                if attempt == config.DOWNLOAD_RETRIES:
+                    raise Exception(f"{name} failed after {attempt + 1} attempts: {e}")
+                time.sleep(_backoff(name, attempt, e))
+            finally:
+                if method != 'GET' and os.path.exists(part):
+                    os.remove(part)
+
+async def download_async(url, output_path, method='GET', headers=None, name='download',
+                         provider=None, model=None, video_id=None, **kwargs):
+    """download() on the shared async HTTP client; 4xx raise httpx.HTTPStatusError"""
+    http = async_clients.http_client()
+    part = _fresh_part(output_path)
+    with metrics.span(name, provider=provider, model=model, video_id=video_id) as span:
+        for attempt in range(config.DOWNLOAD_RETRIES + 1):
+            offset = _resume_from(part, method)
+            try:
+                async with http.stream(method, url, headers=_request_headers(headers, offset),
+                                       timeout=httpx.Timeout(config.DOWNLOAD_READ_TIMEOUT,
+                                                             connect=config.DOWNLOAD_CONNECT_TIMEOUT),
+                                       **kwargs) as response:
+                    if response.status_code == 416 and offset:
+                        os.remove(part)
+                        raise IncompleteDownload("range not satisfiable")
+                    if response.status_code in RETRY_STATUSES:
+                        raise IncompleteDownload(f"HTTP {response.status_code}")
+                    if response.status_code >= 400:
+                        body = (await response.aread()).decode(errors='replace')
+                        raise httpx.HTTPStatusError(
+                            f"{name} failed ({response.status_code}): {body[:500]}",
+                            request=response.request, response=response)
+                    resumed = offset and response.status_code == 206
+                    with open(part, 'ab' if resumed else 'wb') as f:
+                        async for chunk in response.aiter_bytes(config.DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                    _check_length(part, offset, resumed, response.headers.get('Content-Length'))
+                os.replace(part, output_path)
+                span['bytes'] = os.path.getsize(output_path)
+                return output_path
+            except (httpx.TransportError, IncompleteDownload) as e:
+                if attempt == config.DOWNLOAD_RETRIES:
+                    raise Exception(f"{name} failed after {attempt + 1} attempts: {e}")
+                await asyncio.sleep(_backoff(name, attempt, e))
+            finally:
+                if method != 'GET' and os.path.exists(part):
+                    os.remove(part)
@@ -0,0 +1,57 @@
+import re
+import time
+import numpy as np
+import database
+
+# Seconds per word, per sentence stop and per comma-like pause; used until a
+# voice has measurements (0.4 s/word is the old flat 150 words/minute)
+DEFAULTS = np.array([0.4, 0.35, 0.15])
+PRIOR_WEIGHT = 3  # how many samples' worth of pull toward DEFAULTS the fit keeps
+REFIT_SECONDS = 60  # fitted coefficients are reused this long
+
+_fits = {}
+
+def features(script):
+    """(words, sentence stops, comma-like pauses) of a script"""
+    words = len(script.split())
+    stops = len(re.findall(r'[.!?…]+', script))
+    commas = len(re.findall(r'[,;:—–]', script))
+    return words, stops, commas
+
+def coefficients(voice):
+    """Per-feature seconds for a voice, fitted to its measured voiceovers.
+
+    Ridge regression toward DEFAULTS, so a voice with few samples stays
+    close to the defaults and converges to its own pace as samples accrue.
+    """
+    cached = _fits.get(voice)
+    if cached and time.monotonic() - cached[0] < REFIT_SECONDS:
+        return cached[1]
+    samples = database.get_duration_samples(voice) if voice else []
+    if not samples:
+        return DEFAULTS
+    data = np.array(samples, dtype=float)
+    x, y = data[:, :3], data[:, 3]
+    prior = PRIOR_WEIGHT * np.diag((x ** 2).mean(axis=0) + 1e-9)
+    coef = np.linalg.solve(x.T @ x + prior, x.T @ y + prior @ DEFAULTS)
+    coef = np.clip(coef, 0, None)
+    _fits[voice] = (time.monotonic(), coef)
+    return coef
+
+def predict(script, voice=None):
+    """Predicted voiceover length of a script in seconds"""
+    return float(np.dot(features(script), coefficients(voice)))
+
+def seconds_per_word(voice=None):
+    """Average spoken seconds per word, pauses included, for sizing prompts"""
+    samples = database.get_duration_samples(voice) if voice else []
+    words = sum(s[0] for s in samples)
+    if words:
+        return sum(s[3] for s in samples) / words
+    # Defaults with typical pacing: a stop every ~12 words, a comma every ~10
+    return float(DEFAULTS[0] + DEFAULTS[1] / 12 + DEFAULTS[2] / 10)
+
+def record(video_id, voice, script, seconds):
+    """Store a measured voiceover length as a calibration sample"""
+    database.add_duration_sample(video_id, voice, *features(script), seconds)
+    _fits.pop(voice, None)
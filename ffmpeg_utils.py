@@ -0,0 +1,78 @@
+import os
+import re
+import subprocess
+import tempfile
+
+def ffmpeg_exe():
+    """Path of the ffmpeg binary moviepy uses (imageio-ffmpeg), else ffmpeg on PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return 'ffmpeg'
+
+def run(args):
+    """Run ffmpeg with args, raising with its error output if it fails"""
+    result = subprocess.run([ffmpeg_exe(), '-y', '-hide_banner', '-loglevel', 'error', *args],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+
+def filter_escape(value):
+    """Escape a value (e.g. a file path) for use as a filter option inside a filtergraph"""
+    value = value.replace('\\', '/')
+    for char in "\\':":  # option level
+        value = value.replace(char, '\\' + char)
+    for char in "\\'[],;":  # graph level
+        value = value.replace(char, '\\' + char)
+    return value
+
+def fill_filter(width, height, fps):
+    """Filter chain scaling video to cover width x height, centre-cropped, at fps in yuv420p"""
+    return (f'scale={width}:{height}:force_original_aspect_ratio=increase,'
+            f'crop={width}:{height},setsar=1,fps={fps},format=yuv420p')
+
+def duration(path):
+    """Length of a media file in seconds, from its container header"""
+    result = subprocess.run([ffmpeg_exe(), '-hide_banner', '-i', path], capture_output=True, text=True)
+    match = re.search(r'Duration: (\d+):(\d+):(\d+\.\d+)', result.stderr)
+    if not match:
+        raise Exception(f"Could not read duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def join_audio(paths, output_path, gap=0.35, sample_rate=44100):
+    """Join audio clips in order with exactly `gap` seconds of silence between them.
+
+    Each clip's own leading and trailing silence is trimmed first, so the
+    pauses come out even whatever the clips started with.
+    """
+    trim = 'silenceremove=start_periods=1:start_threshold=-50dB'
+    filters = []
+    for i in range(len(paths)):
+        pad = f',apad=pad_dur={gap}' if i < len(paths) - 1 else ''
+        filters.append(f'[{i}:a]aresample={sample_rate},aformat=channel_layouts=mono,'
+                       f'{trim},areverse,{trim},areverse{pad}[a{i}]')
+    filters.append(''.join(f'[a{i}]' for i in range(len(paths))) + f'concat=n={len(paths)}:v=0:a=1[out]')
+    inputs = [arg for path in paths for arg in ('-i', path)]
+    run([*inputs, '-filter_complex', ';'.join(filters), '-map', '[out]',
+         '-c:a', 'libmp3lame', '-b:a', '192k', output_path])
+    return output_path
+
+def concat(paths, output_path, codec_args=('-c', 'copy'), audio_path=None):
+    """Join media files end to end (same codec and parameters) without re-encoding
+
+    With audio_path, the joined video gets that file's audio as its
+    soundtrack in the same pass; codec_args then need to encode or copy it.
+    """
+    fd, list_path = tempfile.mkstemp(suffix='.txt')
+    audio = ['-i', audio_path, '-map', '0:v', '-map', '1:a'] if audio_path else []
+    try:
+        with os.fdopen(fd, 'w') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        run(['-f', 'concat', '-safe', '0', '-i', list_path, *audio, *codec_args, output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
@@ -0,0 +1,101 @@
+import os
+import threading
+
+class FileCache:
+    """Content-addressed files in a directory, evicted least recently used beyond max_mb.
+
+    Entries live at <directory>/<key[:2]>/<key><suffix>; a hit refreshes the
+    file's mtime, which is what eviction orders by. Writes are atomic, so
+    several processes can share one cache directory.
+    """
+
+    def __init__(self, directory, max_mb, suffix):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.size = None  # running total, scanned on first write
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}{self.suffix}')
+
+    def get(self, key):
+        """Path of the entry for key, or None"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def tmp_path(self, key):
+        """Scratch path to write an entry to before put_file()"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp{self.suffix}'
+
+    def put(self, key, data):
+        """Store bytes or text under key; returns the entry's path"""
+        tmp = self.tmp_path(key)
+        with open(tmp, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        return self.put_file(key, tmp)
+
+    def put_file(self, key, tmp):
+        """Move a file written at tmp_path(key) into place; returns the entry's path"""
+        path = self.path(key)
+        size = os.path.getsize(tmp)
+        try:
+            replaced = os.path.getsize(path)  # an entry rewritten under the same key
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self.entries())
+            else:
+                self.size += size - replaced
+            if self.size > self.max_bytes:
+                self.size = self.evict()
+        return path
+
+    def entries(self):
+        """(mtime, size, path) of every entry"""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for sub in os.scandir(self.directory):
+            if sub.is_dir():
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(self.suffix) and '.tmp' not in entry.name:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        result.append((st.st_mtime, st.st_size, entry.path))
+        return result
+
+    def evict(self):
+        """Delete the least recently used entries down to 90% of the cap; returns the new size"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        return total
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(directory, max_mb, suffix):
+    """The process-wide FileCache for a directory"""
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None or cache.max_bytes != max_mb * 1024 * 1024:
+            cache = _caches[directory] = FileCache(directory, max_mb, suffix)
+        return cache
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+import config
+import database
+import downloader
+import ffmpeg_utils
+import file_cache
+import metrics
+import rate_limiter
+
+try:
+    import fcntl
+except ImportError:  # Windows: per-asset locking is per process only
+    fcntl = None
+
+# Persistent stock footage library:
+#   - search results are cached per normalized query for FOOTAGE_SEARCH_TTL_HOURS
+#   - clips are stored once by Pexels asset id, next to a proxy transcoded to
+#     the output format that renders use as is; both are evicted least
+#     recently used beyond FOOTAGE_CACHE_MAX_MB
+#   - a clip being downloaded, or a query being searched, is locked (across
+#     threads and processes), so renders that want it at the same time share
+#     the one request
+# Hits and misses are counted in the footage_stats table.
+
+SEARCH_URL = "https://api.pexels.com/videos/search"
+LOCK_BUCKETS = 256  # lock files are shared by hash bucket so they stay bounded
+PARTIAL_STEP = 5  # partial downloads are rounded up to this many seconds
+
+_asset_locks = {}
+_asset_locks_lock = threading.Lock()
+
+def normalize_query(query):
+    """Lowercased, single-spaced query ('+' separated topics included)"""
+    return ' '.join(query.replace('+', ' ').lower().split())
+
+def _store():
+    return file_cache.get_cache(config.FOOTAGE_DIR, config.FOOTAGE_CACHE_MAX_MB, '.mp4')
+
+def parse_assets(data):
+    """[{id, duration, files}] from a Pexels search response; files lists every rendition"""
+    assets = []
+    for video in data.get('videos', []):
+        files = [{'link': f['link'], 'width': f.get('width'), 'height': f.get('height'),
+                  'file_type': f.get('file_type')}
+                 for f in video.get('video_files', []) if f.get('link')]
+        if files:
+            assets.append({'id': video['id'], 'duration': video.get('duration'), 'files': files})
+    return assets
+
+def orientation():
+    return 'landscape' if config.VIDEO_WIDTH >= config.VIDEO_HEIGHT else 'portrait'
+
+def pick_rendition(files, width, height):
+    """Smallest MP4 rendition covering width x height in the output's orientation.
+
+    Falls back to the largest one when none is big enough (it gets upscaled).
+    """
+    def area(f):
+        return (f['width'] or 0) * (f['height'] or 0)
+
+    candidates = [f for f in files if f.get('file_type') in (None, 'video/mp4')] or files
+    sized = [f for f in candidates if f['width'] and f['height']]
+    oriented = [f for f in sized if (f['width'] >= f['height']) == (width >= height)]
+    candidates = oriented or sized or candidates
+    covering = [f for f in candidates if area(f) and f['width'] >= width and f['height'] >= height]
+    return min(covering, key=area) if covering else max(candidates, key=area)
+
+def seconds_needed(assets, seconds):
+    """Seconds of each asset a timeline of `seconds` plays; None is the whole clip, 0 unused.
+
+    Clips play in order and loop (see video_generator.footage_timeline), so
+    only when they add up to more than the timeline do some go partly or
+    wholly unused.
+    """
+    lengths = [asset.get('duration') or 0 for asset in assets]
+    if seconds is None or not all(lengths) or sum(lengths) <= seconds:
+        return [None] * len(assets)
+    needed, remaining = [], seconds
+    for length in lengths:
+        take = min(length, remaining)
+        needed.append(None if take >= length else take)
+        remaining -= take
+    return needed
+
+def cached_search(query, count):
+    """Assets of a fresh cached search for a normalized query, or None"""
+    fresh_since = time.time() - config.FOOTAGE_SEARCH_TTL_HOURS * 3600
+    results = database.get_footage_search(query, count, fresh_since)
+    assets = json.loads(results) if results is not None else None
+    # Results cached before renditions were kept ({id, url, duration}) are re-fetched
+    if assets is not None and not all('files' in asset for asset in assets):
+        return None
+    return assets
+
+def search(query, count=3, video_id=None):
+    """Stock footage assets for a query, from the search cache when fresh"""
+    query = normalize_query(query)
+    assets = cached_search(query, count)
+    if assets is None:
+        # One search per query at a time; the rest wait and read its results
+        with asset_lock(f'search:{count}:{query}'):
+            assets = cached_search(query, count)
+            if assets is None:
+                database.count_footage_event('search_miss')
+                assets = search_pexels(query, count, video_id)
+                database.save_footage_search(query, count, json.dumps(assets))
+                return assets
+    database.count_footage_event('search_hit')
+    return assets
+
+def search_pexels(query, count, video_id=None):
+    headers = {"Authorization": config.PEXELS_API_KEY}
+    params = {"query": query, "per_page": count, "orientation": orientation()}
+
+    def get():
+        with metrics.span('videos.search', provider='pexels', video_id=video_id) as span:
+            response = downloader.session().get(SEARCH_URL, params=params, headers=headers,
+                                                timeout=downloader.timeout())
+            span['bytes'] = len(response.content)
+        return response
+
+    response = rate_limiter.call('pexels', None, get)
+    response.raise_for_status()
+    return parse_assets(response.json())
+
+def asset_key(asset, rendition, seconds=None):
+    # Id first: FileCache fans entries out by the key's first two characters
+    cut = f"-{seconds}s" if seconds else ''
+    return f"{asset['id']}-{rendition['width']}x{rendition['height']}{cut}-pexels"
+
+@contextmanager
+def asset_lock(key):
+    """Hold key's lock against other threads and, where flock exists, other processes"""
+    with _asset_locks_lock:
+        lock = _asset_locks.setdefault(key, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        bucket = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_BUCKETS
+        lock_dir = os.path.join(config.FOOTAGE_DIR, 'locks')
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f'{bucket:03d}.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def partial_seconds(asset, seconds):
+    """Length of the leading cut to download for `seconds` of playback, or None for the whole clip"""
+    if seconds is None:
+        return None
+    # Whole PARTIAL_STEP seconds, so renders needing similar lengths share a cut
+    cut = math.ceil((seconds + config.FOOTAGE_PARTIAL_MARGIN) / PARTIAL_STEP) * PARTIAL_STEP
+    return cut if cut < (asset.get('duration') or 0) else None
+
+def download_cut(url, output_path, seconds, video_id=None):
+    """Copy just the first `seconds` of a remote clip's video stream (ffmpeg reads it with Range requests)"""
+    with metrics.span('video.download', provider='pexels', video_id=video_id) as span:
+        ffmpeg_utils.run(['-t', str(seconds), '-i', url, '-map', '0:v:0', '-c', 'copy',
+                          '-f', 'mp4', output_path])
+        span['bytes'] = os.path.getsize(output_path)
+
+def proxy_key(key, profile):
+    """Key of the render-ready proxy of the clip stored under key, for a render profile's format"""
+    return f"{key}-proxy-{profile['width']}x{profile['height']}@{profile['fps']}"
+
+def _first(store, keys):
+    """(key, path) of the first of keys in the store, else (None, None)"""
+    for key in keys:
+        path = store.get(key)
+        if path:
+            return key, path
+    return None, None
+
+def fetch(asset, video_id=None, seconds=None, profile=None):
+    """Render-ready proxy of an asset's clip, downloading and ingesting it only if no render has yet.
+
+    Uses the smallest rendition that covers the final output size, whatever
+    the profile (config.RENDER_PROFILES, default 'final'), so a draft's
+    download is reused by the final render. With seconds, only a leading cut
+    long enough for that much playback is downloaded, unless the whole clip
+    is already in the library.
+    """
+    store = _store()
+    profile = profile or config.RENDER_PROFILES['final']
+    rendition = pick_rendition(asset['files'], config.VIDEO_WIDTH, config.VIDEO_HEIGHT)
+    cut = partial_seconds(asset, seconds)
+    keys = [asset_key(asset, rendition)] + ([asset_key(asset, rendition, cut)] if cut else [])
+    proxies = [proxy_key(key, profile) for key in keys]
+    _, path = _first(store, proxies)
+    if not path:
+        with asset_lock(keys[-1]):
+            # Another thread or process may have finished it while we waited
+            _, path = _first(store, proxies)
+            if not path:
+                key, source = _first(store, keys)
+                if not source:
+                    key = keys[-1]
+                    source = _download(store, key, rendition['link'], cut, video_id)
+                return ingest(store, key, source, profile, video_id)
+    database.count_footage_event('asset_hit')
+    return path
+
+def ingest(store, key, source, profile, video_id=None):
+    """Transcode a stored clip once into its render-ready proxy, stored beside the original.
+
+    The proxy has the profile's size and fps, yuv420p, no audio and a
+    keyframe every FOOTAGE_PROXY_KEYINT seconds.
+    """
+    proxy = proxy_key(key, profile)
+    keyint = str(round(config.FOOTAGE_PROXY_KEYINT * profile['fps']))
+    tmp = store.tmp_path(proxy)
+    try:
+        with metrics.span('ingest', kind='render', provider='ffmpeg', video_id=video_id) as span:
+            ffmpeg_utils.run(['-i', source, '-map', '0:v:0',
+                              '-vf', ffmpeg_utils.fill_filter(profile['width'], profile['height'], profile['fps']),
+                              '-c:v', 'libx264', '-preset', config.FOOTAGE_PROXY_PRESET,
+                              '-crf', str(config.FOOTAGE_PROXY_CRF), '-g', keyint, '-keyint_min', keyint,
+                              '-sc_threshold', '0', '-movflags', '+faststart', '-f', 'mp4', tmp])
+            span['bytes'] = os.path.getsize(tmp)
+        path = store.put_file(proxy, tmp)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    database.count_footage_event('ingest')
+    return path
+
+def _download(store, key, url, cut, video_id):
+    tmp = store.tmp_path(key)
+    try:
+        if cut:
+            try:
+                download_cut(url, tmp, cut, video_id)
+                database.count_footage_event('partial_download')
+            except Exception as e:
+                # e.g. the host ignores Range and the index is at the end: take the whole file
+                print(f"⚠️  Partial download failed ({e}), downloading the whole clip")
+                cut = None
+        if not cut:
+            downloader.download(url, tmp, name='video.download', provider='pexels', video_id=video_id)
+        size = os.path.getsize(tmp)
+        path = store.put_file(key, tmp)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    database.count_footage_event('asset_miss')
+    database.count_footage_event('bytes_downloaded', size)
+    return path
+
+def timeline_plan(assets, seconds=None):
+    """(asset, seconds it plays or None for all of it) for each asset a `seconds` long timeline uses"""
+    return [(asset, needed) for asset, needed in zip(assets, seconds_needed(assets, seconds))
+            if needed != 0]
+
+def stats():
+    """Hit/miss counts plus the library's current size"""
+    counts = database.get_footage_stats()
+    entries = _store().entries()
+    return {
+        'search_hits': counts.get('search_hit', 0),
+        'search_misses': counts.get('search_miss', 0),
+        'asset_hits': counts.get('asset_hit', 0),
+        'asset_misses': counts.get('asset_miss', 0),
+        'partial_downloads': counts.get('partial_download', 0),
+        'ingests': counts.get('ingest', 0),
+        'bytes_downloaded': counts.get('bytes_downloaded', 0),
+        'clips': len(entries),
+        'bytes': sum(size for _, size, _ in entries),
+    }
@@ -0,0 +1,97 @@
+import json
+import time
+from datetime import datetime
+import config
+import database
+
+JOB_COLUMNS = ['id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'worker_id',
+               'lease_expires_at', 'heartbeat_at', 'video_id', 'error', 'created_at',
+               'started_at', 'finished_at']
+
+JOB_STATUSES = ['queued', 'running', 'done', 'failed', 'dead']
+
+def _job(row):
+    if not row:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    job['payload'] = json.loads(job['payload'] or '{}')
+    return job
+
+def enqueue(kind, payload=None, max_attempts=None):
+    """Add a job ('create' or 'resume') to the queue and return its id"""
+    with database.transaction() as c:
+        c.execute('''INSERT INTO jobs (kind, payload, status, max_attempts, created_at)
+                     VALUES (?, ?, 'queued', ?, ?)''',
+                  (kind, json.dumps(payload or {}), max_attempts or config.JOB_MAX_ATTEMPTS,
+                   datetime.now().isoformat()))
+        return c.lastrowid
+
+def requeue_expired():
+    """Return jobs whose worker stopped heartbeating to the queue (or mark them dead)"""
+    now = time.time()
+    with database.transaction() as c:
+        c.execute('''UPDATE jobs SET status='dead', worker_id=NULL, finished_at=?,
+                         error='Worker lost lease after final attempt'
+                     WHERE status='running' AND lease_expires_at < ? AND attempts >= max_attempts''',
+                  (datetime.now().isoformat(), now))
+        c.execute('''UPDATE jobs SET status='queued', worker_id=NULL
+                     WHERE status='running' AND lease_expires_at < ?''', (now,))
+        return c.rowcount
+
+def claim(worker_id, lease_seconds=None):
+    """Lease the oldest queued job to worker_id; returns the job or None"""
+    lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+    requeue_expired()
+    now = time.time()
+    with database.transaction() as c:
+        c.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY id LIMIT 1")
+        row = c.fetchone()
+        if not row:
+            return None
+        c.execute('''UPDATE jobs SET status='running', worker_id=?, attempts=attempts+1,
+                         lease_expires_at=?, heartbeat_at=?, started_at=?
+                     WHERE id=?''',
+                  (worker_id, now + lease_seconds, now, datetime.now().isoformat(), row[0]))
+        c.execute('SELECT * FROM jobs WHERE id=?', (row[0],))
+        return _job(c.fetchone())
+
+def heartbeat(job_id, worker_id, lease_seconds=None):
+    """Extend the lease; False means the job was taken away from this worker"""
+    lease_seconds = lease_seconds or config.JOB_LEASE_SECONDS
+    now = time.time()
+    with database.transaction() as c:
+        c.execute('''UPDATE jobs SET lease_expires_at=?, heartbeat_at=?
+                     WHERE status='running' AND id=? AND worker_id=?''',
+                  (now + lease_seconds, now, job_id, worker_id))
+        return c.rowcount == 1
+
+def attach_video(job_id, video_id):
+    """Remember the video a job created, so a retry resumes it instead of starting over"""
+    with database.transaction() as c:
+        c.execute('UPDATE jobs SET video_id=? WHERE id=?', (video_id, job_id))
+
+def finish(job_id, worker_id, status, video_id=None, error=None):
+    """Mark a running job done or failed (ignored if the lease was lost)"""
+    with database.transaction() as c:
+        c.execute('''UPDATE jobs SET status=?, video_id=COALESCE(?, video_id), error=?,
+                         finished_at=?, lease_expires_at=NULL
+                     WHERE status='running' AND id=? AND worker_id=?''',
+                  (status, video_id, error, datetime.now().isoformat(), job_id, worker_id))
+
+def get_job(job_id):
+    conn = database.get_connection()
+    return _job(conn.execute('SELECT * FROM jobs WHERE id=?', (job_id,)).fetchone())
+
+def list_jobs(status=None, limit=50):
+    conn = database.get_connection()
+    if status:
+        rows = conn.execute('SELECT * FROM jobs WHERE status=? ORDER BY id DESC LIMIT ?',
+                            (status, limit)).fetchall()
+    else:
+        rows = conn.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+    return [_job(row) for row in rows]
+
+def job_counts():
+    conn = database.get_connection()
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    return {status: counts.get(status, 0) for status in JOB_STATUSES}
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import threading
+import time
+from openai import OpenAI
+import async_clients
+import config
+import file_cache
+import metrics
+import rate_limiter
+
+# Shared chat-completion layer with a content-addressed response cache.
+#
+# LLM_CACHE_MODE:
+#   'on'     - serve cached responses, record new ones
+#   'off'    - always call the API, record nothing
+#   'replay' - serve recorded responses only; a miss raises ReplayMiss and
+#              nothing touches the network (offline runs, load tests)
+#
+# Calls made with cache=False (high-temperature creative calls) skip the
+# cache lookup but are still recorded, so replay mode can serve them.
+
+class ReplayMiss(Exception):
+    pass
+
+_client = None
+_client_lock = threading.Lock()
+
+def client():
+    """Shared OpenAI client, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAI(api_key=config.OPENAI_API_KEY)
+        return _client
+
+def cache_key(model, messages, temperature, params):
+    payload = json.dumps({'model': model, 'messages': messages, 'temperature': temperature,
+                          'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _store():
+    return file_cache.get_cache(config.LLM_CACHE_DIR, config.LLM_CACHE_MAX_MB, '.json')
+
+def lookup(key):
+    """Recorded response content for key, or None; a hit counts as a use for LRU"""
+    path = _store().get(key)
+    if not path:
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)['content']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def record(key, model, content, tokens):
+    """Store a response; least recently used entries are evicted over the size cap"""
+    _store().put(key, json.dumps({'model': model, 'content': content, 'tokens': tokens,
+                                  'recorded_at': time.time()}))
+
+def _cached(key, model, cache):
+    """Cached content to serve for this call, honoring the cache mode"""
+    mode = config.LLM_CACHE_MODE
+    if mode == 'replay':
+        content = lookup(key)
+        if content is None:
+            raise ReplayMiss(f'No recorded {model} response for key {key[:12]}')
+    elif mode == 'on' and cache:
+        content = lookup(key)
+    else:
+        return None
+    if content is not None:
+        # Only calls the cache actually served count as cache calls
+        with metrics.span('chat.completions', provider='llm_cache', model=model):
+            pass
+    return content
+
+def _record(key, model, content, tokens):
+    if config.LLM_CACHE_MODE != 'off':
+        try:
+            record(key, model, content, tokens)
+        except OSError as e:
+            print(f"⚠️  Could not cache LLM response: {e}")
+    return content
+
+def complete(model, messages, temperature=1.0, completion_tokens=1000, cache=True, **params):
+    """Chat completion text for messages, served from the cache when allowed"""
+    key = cache_key(model, messages, temperature, params)
+    content = _cached(key, model, cache)
+    if content is not None:
+        return content
+
+    def create():
+        with metrics.span('chat.completions', provider='openai', model=model) as span:
+            response = client().chat.completions.create(
+                model=model, messages=messages, temperature=temperature, **params
+            )
+            span['tokens'] = metrics.usage_tokens(response)
+        return response
+
+    prompt = ''.join(m['content'] for m in messages)
+    response = rate_limiter.call('openai', model, create,
+                                 tokens=rate_limiter.estimate_tokens(prompt, completion_tokens))
+    return _record(key, model, response.choices[0].message.content, metrics.usage_tokens(response))
+
+def stream(model, messages, temperature=1.0, completion_tokens=1000, cache=True, **params):
+    """complete() as a generator of text pieces, yielded as the model writes them.
+
+    Shares complete()'s cache keys; a cached reply arrives as one piece.
+    """
+    key = cache_key(model, messages, temperature, params)
+    content = _cached(key, model, cache)
+    if content is not None:
+        yield content
+        return
+
+    def create():
+        return client().chat.completions.create(
+            model=model, messages=messages, temperature=temperature,
+            stream=True, stream_options={'include_usage': True}, **params
+        )
+
+    prompt = ''.join(m['content'] for m in messages)
+    parts = []
+    with metrics.span('chat.completions.stream', provider='openai', model=model) as span:
+        response = rate_limiter.call('openai', model, create,
+                                     tokens=rate_limiter.estimate_tokens(prompt, completion_tokens))
+        try:
+            for chunk in response:
+                if getattr(chunk, 'usage', None):
+                    span['tokens'] = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+        finally:
+            # Also runs when the caller stops reading early
+            if hasattr(response, 'close'):
+                response.close()
+    _record(key, model, ''.join(parts), span['tokens'])
+
+async def complete_async(model, messages, temperature=1.0, completion_tokens=1000, cache=True, **params):
+    """complete() on the shared async OpenAI client"""
+    key = cache_key(model, messages, temperature, params)
+    content = _cached(key, model, cache)
+    if content is not None:
+        return content
+
+    aclient = async_clients.openai_client()
+
+    async def create():
+        with metrics.span('chat.completions', provider='openai', model=model) as span:
+            response = await aclient.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, **params
+            )
+            span['tokens'] = metrics.usage_tokens(response)
+        return response
+
+    prompt = ''.join(m['content'] for m in messages)
+    response = await rate_limiter.call_async('openai', model, create,
+                                             tokens=rate_limiter.estimate_tokens(prompt, completion_tokens))
+    return _record(key, model, response.choices[0].message.content, metrics.usage_tokens(response))
+
+def user(prompt):
+    """Messages list for a single user prompt"""
+    return [{"role": "user", "content": prompt}]
@@ -0,0 +1,136 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import config
+import database
+
+# Video the current thread (or asyncio task) is working on; pipeline stages set
+# it so outbound calls deep inside the generators are attributed without
+# passing ids around
+_current_video = ContextVar('current_video', default=None)
+
+def bind_video(video_id):
+    _current_video.set(video_id)
+
+def current_video():
+    return _current_video.get()
+
+@contextmanager
+def span(name, kind='call', provider=None, model=None, video_id=None):
+    """Time a block and record it as a span.
+
+    Yields a dict the caller can fill with 'bytes', 'tokens' and 'outcome'.
+    The outcome is 'error' if the block raises.
+    """
+    info = {'bytes': None, 'tokens': None, 'outcome': 'ok'}
+    started_at = time.time()
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield info
+        outcome = info['outcome']
+    finally:
+        database.record_span(
+            video_id or current_video(), kind, name, provider, model, started_at,
+            (time.perf_counter() - start) * 1000,
+            nbytes=info['bytes'], tokens=info['tokens'], outcome=outcome
+        )
+
+def usage_tokens(response):
+    """Total tokens from an OpenAI response, if it reports usage"""
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def latency_stats(window=None):
+    """Rolling per-(kind, name, provider) latency stats over the last `window` seconds"""
+    since = time.time() - (window or config.METRICS_WINDOW_SECONDS)
+    groups = {}
+    for kind, name, provider, duration_ms, outcome, tokens, nbytes in database.get_recent_spans(since):
+        g = groups.setdefault((kind, name, provider or ''), {
+            'durations': [], 'errors': 0, 'tokens': 0, 'bytes': 0
+        })
+        g['durations'].append(duration_ms / 1000)
+        g['errors'] += outcome != 'ok'
+        g['tokens'] += tokens or 0
+        g['bytes'] += nbytes or 0
+
+    for g in groups.values():
+        durations = sorted(g['durations'])
+        g['count'] = len(durations)
+        g['sum'] = sum(durations)
+        g['p50'] = percentile(durations, 0.5)
+        g['p90'] = percentile(durations, 0.9)
+        g['p99'] = percentile(durations, 0.99)
+        g['buckets'] = [(le, sum(1 for d in durations if d <= le)) for le in config.METRICS_BUCKETS]
+        del g['durations']
+    return groups
+
+def video_timings(video_id):
+    """Per-video timing breakdown: stage durations plus every outbound call"""
+    stages, calls = {}, []
+    for kind, name, provider, model, started_at, duration_ms, nbytes, tokens, outcome in database.get_spans(video_id):
+        if kind == 'stage':
+            stages[name] = duration_ms
+        else:
+            calls.append({'kind': kind, 'name': name, 'provider': provider, 'model': model,
+                          'started_at': started_at, 'duration_ms': duration_ms,
+                          'bytes': nbytes, 'tokens': tokens, 'outcome': outcome})
+    return {'stages': stages, 'calls': calls}
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+def prometheus_text(extra_gauges=None):
+    """Render rolling latency stats in the Prometheus text exposition format"""
+    stats = latency_stats()
+    lines = []
+    families = [
+        ('stage', 'pipeline_stage_duration_seconds', 'Pipeline stage latency'),
+        ('call', 'outbound_call_duration_seconds', 'Outbound API call latency'),
+        ('render', 'render_step_duration_seconds', 'Local render step latency'),
+        ('throttle', 'rate_limit_wait_seconds', 'Time calls waited for rate limit capacity'),
+    ]
+    window = config.METRICS_WINDOW_SECONDS
+    for kind, family, help_text in families:
+        rows = sorted((k, v) for k, v in stats.items() if k[0] == kind)
+        lines.append(f'# HELP {family} {help_text} over the last {window}s')
+        lines.append(f'# TYPE {family} histogram')
+        for (_, name, provider), g in rows:
+            labels = {'name': name, 'provider': provider}
+            for le, count in g['buckets']:
+                lines.append(f'{family}_bucket{_labels(**labels, le=le)} {count}')
+            lines.append(f'{family}_bucket{_labels(**labels, le="+Inf")} {g["count"]}')
+            lines.append(f'{family}_sum{_labels(**labels)} {g["sum"]:.3f}')
+            lines.append(f'{family}_count{_labels(**labels)} {g["count"]}')
+
+        lines.append(f'# HELP {family}_quantile {help_text} percentiles over the last {window}s')
+        lines.append(f'# TYPE {family}_quantile gauge')
+        for (_, name, provider), g in rows:
+            for q in ('p50', 'p90', 'p99'):
+                labels = _labels(name=name, provider=provider, quantile=f'0.{q[1:]}')
+                lines.append(f'{family}_quantile{labels} {g[q]:.3f}')
+
+    calls = sorted((k, v) for k, v in stats.items() if k[0] in ('call', 'render'))
+    for metric, key, help_text in (
+        ('outbound_call_errors', 'errors', 'Failed calls'),
+        ('outbound_call_tokens', 'tokens', 'LLM tokens used'),
+        ('outbound_call_bytes', 'bytes', 'Bytes transferred'),
+    ):
+        lines.append(f'# HELP {metric} {help_text} over the last {window}s')
+        lines.append(f'# TYPE {metric} gauge')
+        for (kind, name, provider), g in calls:
+            lines.append(f'{metric}{_labels(kind=kind, name=name, provider=provider)} {g[key]}')
+
+    for metric, help_text, values in extra_gauges or []:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for labels, value in values:
+            lines.append(f'{metric}{_labels(**labels) if labels else ""} {value}')
+
+    return '\n'.join(lines) + '\n'
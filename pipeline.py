@@ -7,8 +7,20 @@ try:
 except:
     import video_generator_simple as video_generator
 import seo_generator
+import duration_model
+import ffmpeg_utils
+import similarity_index
 import youtube_uploader
+import config
+import metrics
+import asyncio
+import functools
+import json
+import os
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
 from datetime import datetime
 
 STAGES = [
@@ -16,120 +28,610 @@ STAGES = [
     ('script_generation', 'Script Generation', 20),
     ('audio_generation', 'Audio Generation', 40),
     ('video_generation', 'Video Generation', 60),
+    ('final_render', 'Final Render', 70),
     ('metadata_generation', 'Metadata Generation', 80),
     ('scheduling', 'Scheduling Upload', 90),
     ('completed', 'Completed', 100)
 ]
 
+# Stage dependency graph: (stage_key, depends_on, kind). Stages whose
+# dependencies are met run concurrently; 'api' stages wait on remote
+# services, 'render' stages are CPU-bound.
+STAGE_GRAPH = [
+    ('sourcing', (), 'api'),
+    ('script_generation', ('sourcing',), 'api'),
+    ('audio_generation', ('script_generation',), 'api'),
+    ('video_generation', ('audio_generation',), 'render'),
+    ('final_render', ('video_generation',), 'render'),
+    ('metadata_generation', ('script_generation',), 'api'),
+    ('scheduling', ('final_render', 'metadata_generation'), 'api'),
+]
+
+# Context keys each stage produces; saved as its checkpoint and restored on resume
+STAGE_OUTPUTS = {
+    'sourcing': ('topic',),
+    'script_generation': ('script',),
+    'audio_generation': ('audio_path',),
+    'video_generation': ('video_path', 'video_profile'),
+    'final_render': ('video_path', 'video_profile'),
+    'metadata_generation': ('metadata',),
+    'scheduling': ('scheduled_time',),
+}
+
+# Stages whose outputs are files that must still be on disk to be reused
+STAGE_ARTIFACTS = {
+    'audio_generation': 'audio_path',
+    'video_generation': 'video_path',
+    'final_render': 'video_path',
+}
+
+class AwaitingReview(Exception):
+    """The draft render is waiting for approval; the final render resumes once approved"""
+
 def update_stage(video_id, stage_key, status='in_progress', message=''):
     stage_info = next((s for s in STAGES if s[0] == stage_key), None)
     if stage_info:
-        database.update_video(video_id, stage=stage_key, stage_progress=stage_info[2])
-        database.log_stage(video_id, stage_key, status, message)
+        with database.transaction():
+            database.update_video(video_id, stage=stage_key, stage_progress=stage_info[2])
+            database.log_stage(video_id, stage_key, status, message)
         print(f"  [{stage_info[2]}%] {stage_info[1]}: {message}")
 
-def run_pipeline(channel_id=1, content_source='trending', custom_topic=None):
-    """Execute full content creation pipeline with stage tracking"""
-    video_id = None
-    
+def update_progress(video_id, done):
+    """Point the video at the first stage (in STAGES order) not yet done.
+
+    Stages can finish out of order, so progress only advances once every
+    earlier stage has completed.
+    """
+    stage_key, _, progress = next(s for s in STAGES if s[0] not in done)
+    database.update_video(video_id, stage=stage_key, stage_progress=progress)
+
+def parse_metadata(raw):
+    """Parse the SEO generator's JSON reply, tolerating markdown code fences"""
+    text = raw.strip()
+    if text.startswith('```'):
+        text = text.strip('`')
+        text = text[text.find('{'):]
     try:
-        database.init_db()
-        
-        # Stage 1: Content Sourcing
-        print("\n" + "="*60)
-        print("STAGE 1: CONTENT SOURCING")
-        print("="*60)
-        
-        if custom_topic:
-            topic = custom_topic
-            update_stage(video_id, 'sourcing', 'completed', f'Using custom topic: {topic}')
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+
+def duplicate_of(kind, text, video_id=None):
+    """Report a near-duplicate of an earlier video's topic/script; True if one was found"""
+    match = similarity_index.find_duplicate(kind, text, video_id)
+    if match:
+        print(f"♻️  {kind.capitalize()} is {match[1]:.0%} similar to video {match[0]}, trying another")
+    return bool(match)
+
+def no_fresh(kind):
+    return similarity_index.DuplicateContentError(
+        f'No {kind} sufficiently different from earlier videos after {config.SIMILARITY_RETRIES + 1} tries')
+
+def stage_sourcing(ctx):
+    if ctx['custom_topic']:
+        # Asked-for topics are kept; the script gate still catches repeats
+        topic = ctx['custom_topic']
+    else:
+        for _ in range(config.SIMILARITY_RETRIES + 1):
+            topic = content_sourcer.source_content(ctx['channel_id'])
+            if not duplicate_of('topic', topic):
+                break
+        else:
+            raise no_fresh('topic')
+
+    return add_sourced_video(ctx, topic)
+
+def add_sourced_video(ctx, topic):
+    ctx['topic'] = topic
+    ctx['video_id'] = database.add_video(topic, ctx['channel_id'], ctx['content_source'], 'sourcing')
+    similarity_index.remember('topic', ctx['video_id'], topic)
+    metrics.bind_video(ctx['video_id'])
+    if ctx['on_video']:
+        ctx['on_video'](ctx['video_id'])
+    return f'Topic: {topic}'
+
+def stage_script(ctx):
+    # Gate before audio: a script too close to an earlier one is regenerated
+    for _ in range(config.SIMILARITY_RETRIES + 1):
+        if config.STREAM_SCRIPT_AUDIO:
+            script, duration = stream_script(ctx)
+            if not script_generator.length_ok(duration):
+                # Fall back to generate-then-fix so no more TTS is spent on it
+                discard_streamed_audio(ctx)
+                script, duration = script_generator.create_script(ctx['topic'])
         else:
-            topic = content_sourcer.source_content()
-            update_stage(video_id, 'sourcing', 'completed', f'Sourced topic: {topic}')
-        
-        video_id = database.add_video(topic, channel_id, content_source, 'sourcing')
-        update_stage(video_id, 'sourcing', 'completed', f'Topic: {topic}')
-        
-        # Stage 2: Script Generation
-        print("\n" + "="*60)
-        print("STAGE 2: SCRIPT GENERATION")
-        print("="*60)
-        update_stage(video_id, 'script_generation', 'in_progress', 'Generating script...')
-        
-        script, duration = script_generator.create_script(topic)
-        database.update_video(video_id, script=script)
-        update_stage(video_id, 'script_generation', 'completed', f'Script generated ({duration}s)')
-        
-        # Stage 3: Audio Generation
-        print("\n" + "="*60)
-        print("STAGE 3: AUDIO GENERATION")
-        print("="*60)
-        update_stage(video_id, 'audio_generation', 'in_progress', 'Generating voiceover...')
-        
-        audio_path = audio_generator.create_audio(script, video_id)
-        database.update_video(video_id, audio_path=audio_path)
-        update_stage(video_id, 'audio_generation', 'completed', f'Audio saved: {audio_path}')
-        
-        # Stage 4: Video Generation
-        print("\n" + "="*60)
-        print("STAGE 4: VIDEO GENERATION")
-        print("="*60)
-        update_stage(video_id, 'video_generation', 'in_progress', 'Assembling video...')
-        
-        video_path = video_generator.create_video(audio_path, script, video_id, topic)
-        database.update_video(video_id, video_path=video_path)
-        update_stage(video_id, 'video_generation', 'completed', f'Video saved: {video_path}')
-        
-        # Stage 5: SEO Metadata
-        print("\n" + "="*60)
-        print("STAGE 5: METADATA GENERATION")
-        print("="*60)
-        update_stage(video_id, 'metadata_generation', 'in_progress', 'Creating SEO metadata...')
-        
-        metadata = seo_generator.create_metadata(topic, script)
-        database.update_video(
-            video_id, 
-            title=metadata.get('title', topic),
-            description=metadata.get('description', ''),
-            tags=str(metadata.get('tags', []))
-        )
-        update_stage(video_id, 'metadata_generation', 'completed', f'Title: {metadata.get("title")}')
-        
-        # Stage 6: Schedule Upload
-        print("\n" + "="*60)
-        print("STAGE 6: SCHEDULING UPLOAD")
-        print("="*60)
-        update_stage(video_id, 'scheduling', 'in_progress', 'Scheduling upload...')
-        
-        upload_data = youtube_uploader.upload_to_youtube(video_path, metadata)
-        database.update_video(
-            video_id, 
-            scheduled_time=str(upload_data['scheduled_time']),
-            status='ready'
-        )
-        update_stage(video_id, 'scheduling', 'completed', f'Scheduled: {upload_data["scheduled_time"]}')
-        update_stage(video_id, 'completed', 'completed', 'Pipeline completed successfully')
-        
-        print("\n" + "="*60)
-        print("✅ PIPELINE COMPLETE")
-        print("="*60)
-        print(f"Video ID: {video_id}")
-        print(f"Topic: {topic}")
-        print(f"Video: {video_path}")
-        print(f"Scheduled: {upload_data['scheduled_time']}")
-        
-        return video_id
-        
+            script, duration = script_generator.create_script(ctx['topic'])
+        if not duplicate_of('script', script, ctx['video_id']):
+            break
+        discard_streamed_audio(ctx)
+    else:
+        raise no_fresh('script')
+    return save_script(ctx, script, duration)
+
+def stream_script(ctx):
+    """Stream the script, voicing each sentence as it completes; stage_audio collects the result"""
+    print("🎙️  Streaming voiceover...")
+    audio = audio_generator.SentenceVoiceover(audio_generator.audio_path_for(ctx['video_id']))
+    try:
+        result = script_generator.create_script_streamed(ctx['topic'], audio.add)
+    except Exception:
+        audio.cancel()
+        raise
+    ctx['streamed_audio'] = audio
+    return result
+
+def discard_streamed_audio(ctx):
+    audio = ctx.pop('streamed_audio', None)
+    if audio:
+        audio.cancel()
+
+def save_script(ctx, script, duration):
+    database.update_video(ctx['video_id'], script=script)
+    similarity_index.remember('script', ctx['video_id'], script)
+    ctx['script'] = script
+    return f'Script generated ({duration}s)'
+
+def stage_audio(ctx):
+    streamed = ctx.pop('streamed_audio', None)
+    if streamed:
+        audio_path = streamed.finish()
+    else:
+        audio_path = audio_generator.create_audio(ctx['script'], ctx['video_id'])
+    return save_audio(ctx, audio_path)
+
+def save_audio(ctx, audio_path):
+    database.update_video(ctx['video_id'], audio_path=audio_path)
+    ctx['audio_path'] = audio_path
+    # Feed the real voiceover length back into the script duration model
+    try:
+        seconds = ffmpeg_utils.duration(audio_path)
+        duration_model.record(ctx['video_id'], audio_generator.voice(), ctx['script'], seconds)
     except Exception as e:
-        error_msg = traceback.format_exc()
-        print(f"\n❌ ERROR: {str(e)}")
-        print(error_msg)
-        
-        if video_id:
+        print(f"⚠️  Could not measure voiceover length: {e}")
+        seconds = None
+    return f'Audio saved: {audio_path}' + (f' ({seconds:.1f}s)' if seconds else '')
+
+def segment_workers(concurrent_renders):
+    """Segments per render, so that many renders at once share the cores rather than oversubscribe them"""
+    return max(1, min(config.RENDER_SEGMENT_WORKERS, (os.cpu_count() or 1) // concurrent_renders))
+
+def first_profile():
+    """Profile the video stage renders: a draft when drafts are reviewed first"""
+    return 'draft' if config.REVIEW_DRAFTS else 'final'
+
+def stage_video(ctx):
+    return render_profile(ctx, first_profile())
+
+def stage_final_render(ctx):
+    ctx.setdefault('video_profile', 'final')  # videos rendered before render profiles
+    if ctx['video_profile'] == 'final':
+        return 'Final render not needed'
+    check_approved(ctx)
+    return render_profile(ctx, 'final')
+
+def render_profile(ctx, profile):
+    render = ctx.get('render') or video_generator.create_video
+    video_path = render(ctx['audio_path'], ctx['script'], ctx['video_id'], ctx['topic'], profile=profile)
+    return save_video(ctx, video_path, profile)
+
+def check_approved(ctx):
+    """Raise AwaitingReview unless the video's draft has been approved"""
+    video = dict(zip(database.VIDEO_COLUMNS, database.get_video(ctx['video_id'])))
+    if not video['approved']:
+        raise AwaitingReview(f"Draft awaiting review: {ctx['video_path']}")
+
+def save_video(ctx, video_path, profile):
+    # A draft is held for review; approving it lets the final render run
+    database.update_video(ctx['video_id'], video_path=video_path,
+                          **({'requires_review': 1} if profile != 'final' else {}))
+    ctx['video_path'] = video_path
+    ctx['video_profile'] = profile
+    return f'Video saved ({profile}): {video_path}'
+
+def stage_metadata(ctx):
+    metadata = parse_metadata(seo_generator.create_metadata(ctx['topic'], ctx['script']))
+    database.update_video(
+        ctx['video_id'],
+        title=metadata.get('title', ctx['topic']),
+        description=metadata.get('description', ''),
+        tags=str(metadata.get('tags', []))
+    )
+    ctx['metadata'] = metadata
+    return f'Title: {metadata.get("title")}'
+
+def stage_scheduling(ctx):
+    upload_data = youtube_uploader.upload_to_youtube(ctx['video_path'], json.dumps(ctx['metadata']))
+    database.update_video(
+        ctx['video_id'],
+        scheduled_time=str(upload_data['scheduled_time']),
+        status='ready'
+    )
+    ctx['scheduled_time'] = upload_data['scheduled_time']
+    return f'Scheduled: {upload_data["scheduled_time"]}'
+
+STAGE_FUNCTIONS = {
+    'sourcing': stage_sourcing,
+    'script_generation': stage_script,
+    'audio_generation': stage_audio,
+    'video_generation': stage_video,
+    'final_render': stage_final_render,
+    'metadata_generation': stage_metadata,
+    'scheduling': stage_scheduling,
+}
+
+async def stage_sourcing_async(ctx):
+    if ctx['custom_topic']:
+        topic = ctx['custom_topic']
+    else:
+        for _ in range(config.SIMILARITY_RETRIES + 1):
+            topic = await content_sourcer.source_content_async(ctx['channel_id'])
+            if not duplicate_of('topic', topic):
+                break
+        else:
+            raise no_fresh('topic')
+
+    return add_sourced_video(ctx, topic)
+
+async def stage_script_async(ctx):
+    if config.STREAM_SCRIPT_AUDIO:
+        # Streaming TTS runs on threads; keep it off the event loop
+        return await asyncio.to_thread(stage_script, ctx)
+    for _ in range(config.SIMILARITY_RETRIES + 1):
+        script, duration = await script_generator.create_script_async(ctx['topic'])
+        if not duplicate_of('script', script, ctx['video_id']):
+            break
+    else:
+        raise no_fresh('script')
+    return save_script(ctx, script, duration)
+
+async def stage_audio_async(ctx):
+    if ctx.get('streamed_audio'):
+        return await asyncio.to_thread(stage_audio, ctx)
+    audio_path = await audio_generator.create_audio_async(ctx['script'], ctx['video_id'])
+    # Probes the file and writes the duration model: keep both off the event loop
+    return await asyncio.to_thread(save_audio, ctx, audio_path)
+
+async def stage_video_async(ctx):
+    return await render_profile_async(ctx, first_profile())
+
+async def stage_final_render_async(ctx):
+    ctx.setdefault('video_profile', 'final')  # videos rendered before render profiles
+    if ctx['video_profile'] == 'final':
+        return 'Final render not needed'
+    check_approved(ctx)
+    return await render_profile_async(ctx, 'final')
+
+async def render_profile_async(ctx, profile):
+    # Footage downloads on the event loop; only the CPU-bound render leaves it
+    download = getattr(video_generator, 'download_stock_footage_async', None)
+    footage_paths = None
+    if download:
+        seconds = await asyncio.to_thread(ffmpeg_utils.duration, ctx['audio_path'])
+        footage_paths = await download(ctx['topic'], video_id=ctx['video_id'], seconds=seconds,
+                                       profile=config.RENDER_PROFILES[profile])
+    render = ctx.get('render') or video_generator.create_video
+    video_path = await asyncio.get_running_loop().run_in_executor(
+        ctx.get('render_executor'), functools.partial(render, profile=profile),
+        ctx['audio_path'], ctx['script'], ctx['video_id'], ctx['topic'], footage_paths
+    )
+    return save_video(ctx, video_path, profile)
+
+async def stage_metadata_async(ctx):
+    metadata = parse_metadata(await seo_generator.create_metadata_async(ctx['topic'], ctx['script']))
+    database.update_video(
+        ctx['video_id'],
+        title=metadata.get('title', ctx['topic']),
+        description=metadata.get('description', ''),
+        tags=str(metadata.get('tags', []))
+    )
+    ctx['metadata'] = metadata
+    return f'Title: {metadata.get("title")}'
+
+async def stage_scheduling_async(ctx):
+    return stage_scheduling(ctx)
+
+ASYNC_STAGE_FUNCTIONS = {
+    'sourcing': stage_sourcing_async,
+    'script_generation': stage_script_async,
+    'audio_generation': stage_audio_async,
+    'video_generation': stage_video_async,
+    'final_render': stage_final_render_async,
+    'metadata_generation': stage_metadata_async,
+    'scheduling': stage_scheduling_async,
+}
+
+def run_stage(ctx, stage_key, kind='api'):
+    """Run one stage, logging its start and end to stage_logs"""
+    label, progress = next((s[1], s[2]) for s in STAGES if s[0] == stage_key)
+
+    with ctx['gates'].get(kind) or nullcontext():
+        metrics.bind_video(ctx['video_id'])
+        started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        print(f"  [{progress}%] {label}: started")
+
+        status = 'failed'
+        try:
+            with metrics.span(stage_key, kind='stage'):
+                message = STAGE_FUNCTIONS[stage_key](ctx)
+            save_stage_checkpoint(ctx, stage_key)
+            status = 'completed'
+        except AwaitingReview as e:
+            status = 'waiting'
+            message = str(e)
+            raise
+        except Exception as e:
+            message = str(e)
+            raise
+        finally:
+            log_stage_run(ctx, stage_key, status, message, started_at, time.perf_counter() - start)
+
+async def run_stage_async(ctx, stage_key, kind='api'):
+    """run_stage() for the asyncio pipeline; gates are asyncio semaphores"""
+    label, progress = next((s[1], s[2]) for s in STAGES if s[0] == stage_key)
+
+    async with ctx['gates'].get(kind) or nullcontext():
+        metrics.bind_video(ctx['video_id'])
+        started_at = datetime.now().isoformat()
+        start = time.perf_counter()
+        print(f"  [{progress}%] {label}: started")
+
+        status = 'failed'
+        try:
+            with metrics.span(stage_key, kind='stage'):
+                message = await ASYNC_STAGE_FUNCTIONS[stage_key](ctx)
+            save_stage_checkpoint(ctx, stage_key)
+            status = 'completed'
+        except AwaitingReview as e:
+            status = 'waiting'
+            message = str(e)
+            raise
+        except Exception as e:
+            message = str(e)
+            raise
+        finally:
+            log_stage_run(ctx, stage_key, status, message, started_at, time.perf_counter() - start)
+
+def save_stage_checkpoint(ctx, stage_key):
+    database.save_checkpoint(ctx['video_id'], stage_key,
+                             {k: ctx[k] for k in STAGE_OUTPUTS[stage_key]})
+
+def log_stage_run(ctx, stage_key, status, message, started_at, elapsed):
+    label, progress = next((s[1], s[2]) for s in STAGES if s[0] == stage_key)
+    ctx['timings'][stage_key] = elapsed
+    # The video row only exists once sourcing has run, so log the start afterwards
+    if ctx['video_id']:
+        database.log_stage(ctx['video_id'], stage_key, 'started', f'{label} started', started_at)
+        database.log_stage(ctx['video_id'], stage_key, status, f'{message} [{elapsed:.1f}s]')
+    print(f"  [{progress}%] {label}: {message} [{elapsed:.1f}s]")
+
+def run_stage_graph(ctx, graph=STAGE_GRAPH, max_workers=None, done=()):
+    """Execute the stage graph, running stages concurrently once their dependencies are done
+
+    Stages listed in done are treated as already complete and skipped.
+    """
+    done = set(done)
+    pending = {key: deps for key, deps, _ in graph if key not in done}
+    kinds = {key: kind for key, _, kind in graph}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers or config.PIPELINE_STAGE_WORKERS) as pool:
+        while pending or running:
+            for key, deps in list(pending.items()):
+                if all(d in done for d in deps):
+                    running[pool.submit(run_stage, ctx, key, kinds[key])] = key
+                    del pending[key]
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                key = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    # Let in-flight stages finish, but start nothing new
+                    pending.clear()
+                    wait(running)
+                    raise
+                done.add(key)
+                update_progress(ctx['video_id'], done)
+
+    return done
+
+async def run_stage_graph_async(ctx, graph=STAGE_GRAPH, done=()):
+    """run_stage_graph() as asyncio tasks; API stages overlap without threads"""
+    done = set(done)
+    pending = {key: deps for key, deps, _ in graph if key not in done}
+    kinds = {key: kind for key, _, kind in graph}
+    running = {}
+
+    while pending or running:
+        for key, deps in list(pending.items()):
+            if all(d in done for d in deps):
+                running[asyncio.ensure_future(run_stage_async(ctx, key, kinds[key]))] = key
+                del pending[key]
+
+        finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            key = running.pop(task)
+            try:
+                task.result()
+            except Exception:
+                # Let in-flight stages finish, but start nothing new
+                pending.clear()
+                if running:
+                    await asyncio.wait(running)
+                raise
+            done.add(key)
+            update_progress(ctx['video_id'], done)
+
+    return done
+
+def run_pipeline(channel_id=1, content_source='trending', custom_topic=None,
+                 render=None, gates=None, timings=None, on_video=None):
+    """Execute full content creation pipeline with stage tracking
+
+    render replaces video_generator.create_video (e.g. to run it in a process
+    pool), gates maps a stage kind to a context manager held while such a
+    stage runs, timings, if given, receives each stage's duration, and
+    on_video is called with the new video's id as soon as it exists.
+    """
+    ctx = new_context(channel_id, content_source, custom_topic, render, gates, timings)
+    ctx['on_video'] = on_video
+    return execute(ctx)
+
+async def run_pipeline_async(channel_id=1, content_source='trending', custom_topic=None,
+                             render_executor=None, render=None, gates=None, timings=None,
+                             on_video=None):
+    """Coroutine version of run_pipeline for running many videos on one event loop
+
+    API stages await shared async HTTP/OpenAI clients; rendering runs in
+    render_executor (the loop's default thread pool if None). gates maps a
+    stage kind to an asyncio.Semaphore (or other async context manager).
+    """
+    ctx = new_context(channel_id, content_source, custom_topic, render, gates, timings)
+    ctx['on_video'] = on_video
+    ctx['render_executor'] = render_executor
+    try:
+        database.init_db()
+        announce_start(ctx)
+        await run_stage_graph_async(ctx)
+        return finish_success(ctx)
+    except AwaitingReview:
+        return finish_review(ctx)
+    except Exception as e:
+        return finish_failure(ctx, e)
+    finally:
+        database.flush_logs()
+
+def resume_pipeline(video_id, render=None, gates=None, timings=None):
+    """Continue a video's pipeline from its first incomplete stage
+
+    Completed stages are restored from their checkpoints; a stage whose file
+    output is missing or empty is rerun along with everything downstream.
+    """
+    database.init_db()
+    row = database.get_video(video_id)
+    if not row:
+        print(f"❌ Video {video_id} not found")
+        return None
+    video = dict(zip(database.VIDEO_COLUMNS, row))
+
+    ctx = new_context(video['channel_id'], video['content_source'], None, render, gates, timings)
+    ctx['video_id'] = video_id
+    ctx['topic'] = video['topic']
+
+    checkpoints = database.get_checkpoints(video_id)
+    checkpoints.setdefault('sourcing', {'topic': video['topic']})
+    invalid = {stage for stage, key in STAGE_ARTIFACTS.items()
+               if stage in checkpoints and not artifact_ok(checkpoints[stage].get(key))}
+    invalid = downstream_of(invalid)
+    database.clear_checkpoints(video_id, invalid)
+
+    done = set()
+    # In graph order, so a later stage's output (the final render's video_path) wins
+    for stage_key, _, _ in STAGE_GRAPH:
+        if stage_key in checkpoints and stage_key not in invalid:
+            ctx.update(checkpoints[stage_key])
+            done.add(stage_key)
+
+    remaining = [key for key, _, _ in STAGE_GRAPH if key not in done]
+    with database.transaction():
+        database.update_video(video_id, status='pending', error_log=None)
+        database.log_stage(video_id, 'resume', 'started',
+                           f'Resuming at: {", ".join(remaining) or "nothing left to run"}')
+    print(f"\n🔁 Resuming video {video_id}: skipping {', '.join(sorted(done))}")
+    return execute(ctx, done)
+
+def artifact_ok(path):
+    return bool(path) and os.path.isfile(path) and os.path.getsize(path) > 0
+
+def downstream_of(stages):
+    """The given stages plus every stage that depends on them, transitively"""
+    result = set(stages)
+    changed = True
+    while changed:
+        changed = False
+        for key, deps, _ in STAGE_GRAPH:
+            if key not in result and result.intersection(deps):
+                result.add(key)
+                changed = True
+    return result
+
+def new_context(channel_id, content_source, custom_topic, render=None, gates=None, timings=None):
+    return {
+        'channel_id': channel_id,
+        'content_source': content_source,
+        'custom_topic': custom_topic,
+        'video_id': None,
+        'render': render,
+        'gates': gates or {},
+        'timings': timings if timings is not None else {},
+        'on_video': None,
+        'render_executor': None,
+    }
+
+def execute(ctx, done=()):
+    """Run the stage graph for ctx, recording success or failure on the video"""
+    try:
+        database.init_db()
+        announce_start(ctx, done)
+        run_stage_graph(ctx, done=done)
+        return finish_success(ctx)
+    except AwaitingReview:
+        return finish_review(ctx)
+    except Exception as e:
+        return finish_failure(ctx, e)
+    finally:
+        database.flush_logs()
+
+def announce_start(ctx, done=()):
+    print("\n" + "="*60)
+    print("🎬 RUNNING PIPELINE")
+    print("="*60)
+
+    if ctx['video_id']:
+        update_progress(ctx['video_id'], done)
+
+def finish_success(ctx):
+    update_stage(ctx['video_id'], 'completed', 'completed', 'Pipeline completed successfully')
+
+    print("\n" + "="*60)
+    print("✅ PIPELINE COMPLETE")
+    print("="*60)
+    print(f"Video ID: {ctx['video_id']}")
+    print(f"Topic: {ctx['topic']}")
+    print(f"Video: {ctx['video_path']}")
+    print(f"Scheduled: {ctx['scheduled_time']}")
+
+    return ctx['video_id']
+
+def finish_review(ctx):
+    """Park the video until its draft is approved; approval queues a resume for the final render"""
+    video_id = ctx['video_id']
+    database.update_video(video_id, status='review', requires_review=1)
+
+    print("\n" + "="*60)
+    print("👀 DRAFT READY FOR REVIEW")
+    print("="*60)
+    print(f"Video ID: {video_id}")
+    print(f"Draft: {ctx['video_path']}")
+
+    return video_id
+
+def finish_failure(ctx, e):
+    """Record the current exception on the video; call from an except block"""
+    error_msg = traceback.format_exc()
+    discard_streamed_audio(ctx)
+    print(f"\n❌ ERROR: {str(e)}")
+    print(error_msg)
+
+    video_id = ctx['video_id']
+    if video_id:
+        with database.transaction():
             database.update_video(video_id, status='failed', error_log=error_msg)
             database.log_stage(video_id, 'error', 'failed', str(e))
-        
-        return None
+
+    return None
 
 if __name__ == "__main__":
     run_pipeline()
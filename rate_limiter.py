@@ -0,0 +1,169 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import config
+import database
+import metrics
+
+class TokenBucket:
+    """Refilling budget of `per_minute` units (requests, tokens or characters).
+
+    Callers reserve units up front and may drive the balance negative; the
+    deficit is how long they wait. Reservations are therefore served in
+    arrival order instead of failing.
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def reserve(self, amount):
+        """Take `amount` units now and return how many seconds to wait for them"""
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        self.available -= amount
+        wait = -self.available / self.rate if self.available < 0 else 0
+        return max(wait, self.blocked_until - now)
+
+_lock = threading.Lock()
+_publish_lock = threading.Lock()
+_buckets = {}
+_waiting = {}
+
+def _buckets_for(provider, model):
+    """Buckets that apply to a call: the provider-wide ones plus the model's own"""
+    result = []
+    for key in [(provider, None)] + ([(provider, model)] if model else []):
+        for unit, per_minute in config.RATE_LIMITS.get(key, {}).items():
+            bucket_key = key + (unit,)
+            if bucket_key not in _buckets:
+                _buckets[bucket_key] = TokenBucket(per_minute)
+            result.append((unit, _buckets[bucket_key]))
+    return result
+
+def reserve(provider, model=None, tokens=0, chars=0):
+    """Reserve capacity for one call and return the seconds to wait before sending it"""
+    amounts = {'requests': 1, 'tokens': tokens, 'chars': chars}
+    with _lock:
+        waits = [bucket.reserve(amounts[unit]) for unit, bucket in _buckets_for(provider, model)
+                 if amounts[unit]]
+    return max(waits, default=0)
+
+def acquire(provider, model=None, tokens=0, chars=0):
+    """Block until a call to provider/model fits within its rate limits"""
+    wait = reserve(provider, model, tokens, chars)
+    if wait <= 0:
+        return 0
+    _track_waiting(provider, model, 1)
+    try:
+        with metrics.span('rate_limit', kind='throttle', provider=provider, model=model):
+            time.sleep(wait)
+    finally:
+        _track_waiting(provider, model, -1)
+    return wait
+
+async def acquire_async(provider, model=None, tokens=0, chars=0):
+    """acquire() for coroutines: waits without blocking the event loop"""
+    wait = reserve(provider, model, tokens, chars)
+    if wait <= 0:
+        return 0
+    _track_waiting(provider, model, 1)
+    try:
+        with metrics.span('rate_limit', kind='throttle', provider=provider, model=model):
+            await asyncio.sleep(wait)
+    finally:
+        _track_waiting(provider, model, -1)
+    return wait
+
+def _track_waiting(provider, model, delta):
+    key = (provider, model)
+    # Published so the dashboard's /metrics sees queues inside worker processes;
+    # serialized so the last count written is the current one
+    with _publish_lock:
+        with _lock:
+            _waiting[key] = _waiting.get(key, 0) + delta
+            waiting = _waiting[key]
+        try:
+            database.set_rate_limit_waiting(f'{socket.gethostname()}-{os.getpid()}', provider, model, waiting)
+        except Exception as e:
+            print(f"⚠️  Could not publish rate limit queue depth: {e}")
+
+def report_throttle(provider, model, retry_after):
+    """Pause every bucket of provider/model for retry_after seconds (server said 429)"""
+    until = time.monotonic() + retry_after
+    with _lock:
+        for _, bucket in _buckets_for(provider, model):
+            bucket.blocked_until = max(bucket.blocked_until, until)
+    print(f"⏳ {provider}/{model or '*'} rate limited, pausing {retry_after:.1f}s")
+
+def queue_depths():
+    """Calls in this process currently waiting for capacity, per (provider, model)"""
+    with _lock:
+        return {key: count for key, count in _waiting.items() if count}
+
+def retry_after_seconds(obj, attempt):
+    """Retry-After from a 429 response or API error, else None if not throttled"""
+    response = getattr(obj, 'response', None) if isinstance(obj, Exception) else obj
+    status = getattr(obj, 'status_code', None) or getattr(response, 'status_code', None)
+    if status != 429:
+        return None
+
+    header = (getattr(response, 'headers', None) or {}).get('retry-after')
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return config.RATE_LIMIT_BACKOFF * 2 ** attempt
+
+def call(provider, model, fn, tokens=0, chars=0, retries=None):
+    """Run fn() within provider/model rate limits, retrying 429s after Retry-After.
+
+    fn may raise an API error or return an HTTP response; either counts as
+    throttled when its status code is 429.
+    """
+    retries = config.RATE_LIMIT_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        acquire(provider, model, tokens, chars)
+        try:
+            result = fn()
+        except Exception as e:
+            retry_after = retry_after_seconds(e, attempt)
+            if retry_after is None or attempt == retries:
+                raise
+        else:
+            retry_after = retry_after_seconds(result, attempt)
+            if retry_after is None or attempt == retries:
+                return result
+        report_throttle(provider, model, retry_after)
+
+async def call_async(provider, model, fn, tokens=0, chars=0, retries=None):
+    """call() for coroutine functions"""
+    retries = config.RATE_LIMIT_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        await acquire_async(provider, model, tokens, chars)
+        try:
+            result = await fn()
+        except Exception as e:
+            retry_after = retry_after_seconds(e, attempt)
+            if retry_after is None or attempt == retries:
+                raise
+        else:
+            retry_after = retry_after_seconds(result, attempt)
+            if retry_after is None or attempt == retries:
+                return result
+        report_throttle(provider, model, retry_after)
+
+def estimate_tokens(prompt, completion=1000):
+    """Rough token count for a chat call: ~4 characters per prompt token plus the reply"""
+    return len(prompt) // 4 + completion
@@ -1,13 +1,13 @@
-from openai import OpenAI
+import audio_generator
 import config
+import duration_model
+import llm
 
-client = OpenAI(api_key=config.OPENAI_API_KEY)
-
-def generate_script(topic):
-    """Generate original, poetic motivational script"""
-    prompt = f"""Create a 45-90 second motivational script about: {topic}
+def script_prompt(topic):
+    return f"""Create a {config.VIDEO_LENGTH_MIN}-{config.VIDEO_LENGTH_MAX} second motivational script about: {topic}
 
 Requirements:
+- About {target_words()} words
 - Poetic, emotional, modern tone
 - Punchy, retention-optimized
 - NO clichés or overused phrases
@@ -18,25 +18,120 @@ Requirements:
 
 Write ONLY the script, no titles or descriptions."""
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.9
-    )
-    
-    script = response.choices[0].message.content.strip()
-    return script
+def trim_prompt(script):
+    return f"""Shorten this motivational script to about {target_words()} words.
+Keep the hook, the voice and the call-to-action at the end; cut the weakest lines.
+
+{script}
+
+Write ONLY the shortened script."""
+
+def target_words():
+    """Words that read in about VIDEO_LENGTH_TARGET seconds with the current voice"""
+    return round(config.VIDEO_LENGTH_TARGET / duration_model.seconds_per_word(audio_generator.voice()))
+
+def generate_script(topic):
+    """Generate original, poetic motivational script"""
+    # Creative call: not served from the cache, only recorded for replay
+    script = llm.complete("gpt-4o", llm.user(script_prompt(topic)), temperature=0.9,
+                          completion_tokens=400, cache=False)
+    return script.strip()
+
+def trim_script(script):
+    """Cut an overlong script down to the target length"""
+    trimmed = llm.complete("gpt-4o", llm.user(trim_prompt(script)), temperature=0.3,
+                           completion_tokens=400)
+    return trimmed.strip()
+
+def create_script_streamed(topic, on_sentence):
+    """create_script() reading the reply as it streams; on_sentence gets each sentence once complete.
+
+    Stops reading once the script already runs past VIDEO_LENGTH_MAX; the
+    returned duration then tells the caller it is unusable.
+    """
+    print(f"📝 Streaming script for: {topic}")
+    parts, buffer = [], ''
+    stream = llm.stream("gpt-4o", llm.user(script_prompt(topic)), temperature=0.9,
+                        completion_tokens=400, cache=False)
+    for piece in stream:
+        parts.append(piece)
+        sentences, buffer = audio_generator.split_sentences(buffer + piece)
+        for sentence in sentences:
+            on_sentence(sentence)
+        if sentences and estimate_duration(''.join(parts)) > config.VIDEO_LENGTH_MAX:
+            stream.close()
+            print(f"✂️  Script passed {config.VIDEO_LENGTH_MAX}s while streaming, stopped")
+            break
+    else:
+        if buffer.strip():
+            on_sentence(buffer.strip())
+
+    script = ''.join(parts).strip()
+    duration = estimate_duration(script)
+    print(f"✓ Script created ({duration}s, {len(script.split())} words)")
+    return script, duration
 
 def estimate_duration(script):
-    """Estimate script duration (avg 150 words per minute)"""
-    words = len(script.split())
-    duration = (words / 150) * 60
-    return round(duration, 1)
+    """Predicted voiceover length, from the duration model calibrated on past audio"""
+    return round(duration_model.predict(script, audio_generator.voice()), 1)
+
+def length_ok(duration):
+    return config.VIDEO_LENGTH_MIN <= duration <= config.VIDEO_LENGTH_MAX
+
+def length_fix(duration):
+    """'trim', 'regenerate' or None for a script of the given predicted duration"""
+    if duration > config.VIDEO_LENGTH_MAX:
+        print(f"✂️  Script runs {duration}s (max {config.VIDEO_LENGTH_MAX}s), trimming")
+        return 'trim'
+    if duration < config.VIDEO_LENGTH_MIN:
+        print(f"🔁 Script runs {duration}s (min {config.VIDEO_LENGTH_MIN}s), regenerating")
+        return 'regenerate'
+    return None
+
+def length_error(duration):
+    return Exception(f"Script length {duration}s outside {config.VIDEO_LENGTH_MIN}-"
+                     f"{config.VIDEO_LENGTH_MAX}s after {config.SCRIPT_LENGTH_RETRIES} retries")
 
 def create_script(topic):
     """Main function to create script"""
     print(f"📝 Generating script for: {topic}")
     script = generate_script(topic)
     duration = estimate_duration(script)
+    # Fix the length before any TTS or render time is spent on it
+    for _ in range(config.SCRIPT_LENGTH_RETRIES):
+        fix = length_fix(duration)
+        if not fix:
+            break
+        script = trim_script(script) if fix == 'trim' else generate_script(topic)
+        duration = estimate_duration(script)
+    if not length_ok(duration):
+        raise length_error(duration)
+    print(f"✓ Script created ({duration}s, {len(script.split())} words)")
+    return script, duration
+
+async def generate_script_async(topic):
+    """generate_script() on the shared async OpenAI client"""
+    script = await llm.complete_async("gpt-4o", llm.user(script_prompt(topic)), temperature=0.9,
+                                      completion_tokens=400, cache=False)
+    return script.strip()
+
+async def trim_script_async(script):
+    trimmed = await llm.complete_async("gpt-4o", llm.user(trim_prompt(script)), temperature=0.3,
+                                       completion_tokens=400)
+    return trimmed.strip()
+
+async def create_script_async(topic):
+    """Async counterpart of create_script()"""
+    print(f"📝 Generating script for: {topic}")
+    script = await generate_script_async(topic)
+    duration = estimate_duration(script)
+    for _ in range(config.SCRIPT_LENGTH_RETRIES):
+        fix = length_fix(duration)
+        if not fix:
+            break
+        script = await (trim_script_async(script) if fix == 'trim' else generate_script_async(topic))
+        duration = estimate_duration(script)
+    if not length_ok(duration):
+        raise length_error(duration)
     print(f"✓ Script created ({duration}s, {len(script.split())} words)")
     return script, duration
@@ -1,11 +1,7 @@
-from openai import OpenAI
-import config
+import llm
 
-client = OpenAI(api_key=config.OPENAI_API_KEY)
-
-def generate_metadata(topic, script):
-    """Generate SEO-optimized title, description, tags"""
-    prompt = f"""Create YouTube metadata for this motivational video:
+def metadata_prompt(topic, script):
+    return f"""Create YouTube metadata for this motivational video:
 
 Topic: {topic}
 Script: {script[:200]}...
@@ -18,13 +14,10 @@ Generate:
 
 Format as JSON with keys: title, description, tags, hashtags"""
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
-    
-    return response.choices[0].message.content
+def generate_metadata(topic, script):
+    """Generate SEO-optimized title, description, tags"""
+    return llm.complete("gpt-4o-mini", llm.user(metadata_prompt(topic, script)), temperature=0.7,
+                        completion_tokens=600)
 
 def create_metadata(topic, script):
     """Main function to create metadata"""
@@ -32,3 +25,15 @@ def create_metadata(topic, script):
     metadata = generate_metadata(topic, script)
     print("✓ Metadata created")
     return metadata
+
+async def generate_metadata_async(topic, script):
+    """generate_metadata() on the shared async OpenAI client"""
+    return await llm.complete_async("gpt-4o-mini", llm.user(metadata_prompt(topic, script)),
+                                    temperature=0.7, completion_tokens=600)
+
+async def create_metadata_async(topic, script):
+    """Async counterpart of create_metadata()"""
+    print("🏷️  Generating SEO metadata...")
+    metadata = await generate_metadata_async(topic, script)
+    print("✓ Metadata created")
+    return metadata
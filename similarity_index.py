@@ -0,0 +1,220 @@
+import atexit
+import os
+import re
+import threading
+import zlib
+import numpy as np
+import config
+import database
+
+# MinHash/LSH parameters; changing them invalidates stored signatures
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+PRIME = 4294967291  # largest prime below 2**32
+SHINGLE_SIZES = {'topic': 2, 'script': 3}
+SAVE_EVERY = 50  # signatures caught up from the database before re-saving the snapshot
+
+_rng = np.random.RandomState(42)
+_A = _rng.randint(1, 2**31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 2**31, NUM_PERM).astype(np.uint64)
+# Salt band hashes so all bands can share one sorted key array
+_BAND_SALT = _rng.randint(0, 2**62, BANDS, dtype=np.int64).astype(np.uint64)
+_FNV_PRIME = np.uint64(1099511628211)
+
+class DuplicateContentError(Exception):
+    pass
+
+def shingles(text, size):
+    """Word n-grams of normalized text (the words themselves if it is shorter)"""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    if len(words) < size:
+        return set(words)
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def signature(text, size):
+    """MinHash signature (NUM_PERM uint32 values), or None for text without words"""
+    grams = shingles(text, size)
+    if not grams:
+        return None
+    x = np.fromiter((zlib.crc32(g.encode()) for g in grams), np.uint64, len(grams))
+    return ((_A[:, None] * x[None, :] + _B[:, None]) % PRIME).min(axis=1).astype(np.uint32)
+
+def band_keys(sigs):
+    """One salted uint64 key per LSH band for each signature row"""
+    bands = sigs.reshape(len(sigs), BANDS, ROWS).astype(np.uint64)
+    keys = np.zeros((len(sigs), BANDS), np.uint64)
+    for r in range(ROWS):
+        keys = (keys * _FNV_PRIME) ^ bands[:, :, r]
+    return keys ^ _BAND_SALT
+
+class SimilarityIndex:
+    """In-memory LSH index over one kind of text ('topic' or 'script') of every video.
+
+    The content_signatures table is the source of truth; a .npz snapshot
+    next to the database makes startup cheap, and each lookup first pulls
+    signatures other processes added since (one indexed query).
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.size = SHINGLE_SIZES[kind]
+        self.path = f"{os.path.splitext(config.DB_PATH)[0]}.{kind}.minhash.npz"
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.seq = 0
+        self.count = 0
+        self.ids = np.empty(0, np.int64)
+        self.sigs = np.empty((0, NUM_PERM), np.uint32)
+        self.keys = np.empty((0, BANDS), np.uint64)
+        self.rows = {}  # video_id -> row
+        self.sorted_keys = np.empty(0, np.uint64)
+        self.sorted_rows = np.empty(0, np.int64)
+        self.sorted_upto = 0  # rows covered by sorted_keys; later rows are scanned
+        self.unsaved = 0
+
+    def _load(self):
+        self.loaded = True
+        if os.path.exists(self.path):
+            try:
+                snap = np.load(self.path)
+                # A snapshot ahead of the table belongs to a different/reset database
+                if int(snap['num_perm']) == NUM_PERM and int(snap['seq']) <= database.get_max_signature_seq():
+                    self._append(snap['ids'], snap['sigs'])
+                    self.seq = int(snap['seq'])
+            except Exception as e:
+                print(f"⚠️  Ignoring unreadable similarity snapshot {self.path}: {e}")
+        self._catch_up()
+        if not self.count:
+            self._backfill()
+            self._catch_up()
+
+    def _backfill(self):
+        """Sign every existing video's text (databases created before this index)"""
+        signed = []
+        for video_id, text in database.get_video_texts(self.kind):
+            sig = signature(text, self.size)
+            if sig is not None:
+                signed.append((video_id, sig.tobytes()))
+        if signed:
+            database.add_content_signatures(self.kind, signed)
+            print(f"✓ Indexed {len(signed)} existing {self.kind}s for duplicate detection")
+
+    def _catch_up(self):
+        rows = database.get_content_signatures(self.kind, self.seq)
+        if not rows:
+            return
+        self.seq = rows[-1][0]
+        self._append(np.array([r[1] for r in rows], np.int64),
+                     np.frombuffer(b''.join(r[2] for r in rows), np.uint32).reshape(len(rows), NUM_PERM))
+        self.unsaved += len(rows)
+        if self.unsaved >= SAVE_EVERY:
+            self.save()
+
+    def _append(self, ids, sigs):
+        keys = band_keys(sigs)
+        for video_id, sig, key in zip(ids.tolist(), sigs, keys):
+            row = self.rows.get(video_id)
+            if row is None:
+                # Grow arrays geometrically so appends stay amortized O(1)
+                if self.count == len(self.ids):
+                    cap = max(1024, 2 * len(self.ids))
+                    self.ids = np.resize(self.ids, cap)
+                    self.sigs = np.resize(self.sigs, (cap, NUM_PERM))
+                    self.keys = np.resize(self.keys, (cap, BANDS))
+                row = self.rows[video_id] = self.count
+                self.ids[row] = video_id
+                self.count += 1
+            # A replaced signature leaves stale sorted keys behind; candidates are
+            # always re-scored against the current signature, so that is harmless
+            self.sigs[row] = sig
+            self.keys[row] = key
+            self.sorted_upto = min(self.sorted_upto, row)
+        if self.count - self.sorted_upto > max(256, self.count // 8):
+            self._sort()
+
+    def _sort(self):
+        flat = self.keys[:self.count].ravel()
+        order = np.argsort(flat, kind='stable')
+        self.sorted_keys = flat[order]
+        self.sorted_rows = (order // BANDS).astype(np.int64)
+        self.sorted_upto = self.count
+
+    def save(self):
+        """Write the snapshot atomically next to the database"""
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, num_perm=NUM_PERM, seq=self.seq,
+                     ids=self.ids[:self.count], sigs=self.sigs[:self.count])
+        os.replace(tmp, self.path)
+        self.unsaved = 0
+
+    def nearest(self, text, exclude_video_id=None):
+        """(video_id, estimated similarity) of the closest indexed item, or (None, 0.0)"""
+        sig = signature(text, self.size)
+        if sig is None:
+            return None, 0.0
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            else:
+                self._catch_up()
+
+            keys = band_keys(sig[None, :])[0]
+            lo = np.searchsorted(self.sorted_keys, keys, 'left')
+            hi = np.searchsorted(self.sorted_keys, keys, 'right')
+            parts = [self.sorted_rows[a:b] for a, b in zip(lo, hi) if b > a]
+            if self.sorted_upto < self.count:
+                tail = (self.keys[self.sorted_upto:self.count] == keys).any(axis=1)
+                parts.append(np.nonzero(tail)[0] + self.sorted_upto)
+            if not parts:
+                return None, 0.0
+
+            candidates = np.unique(np.concatenate(parts))
+            if exclude_video_id is not None:
+                candidates = candidates[self.ids[candidates] != exclude_video_id]
+            if not len(candidates):
+                return None, 0.0
+            scores = (self.sigs[candidates] == sig).mean(axis=1)
+            best = int(scores.argmax())
+            return int(self.ids[candidates[best]]), float(scores[best])
+
+    def add(self, video_id, text):
+        """Index a video's text so later lookups find it"""
+        sig = signature(text, self.size)
+        if sig is None:
+            return
+        database.add_content_signatures(self.kind, [(video_id, sig.tobytes())])
+        with self.lock:
+            if self.loaded:
+                self._catch_up()
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(kind):
+    with _indexes_lock:
+        if kind not in _indexes:
+            _indexes[kind] = SimilarityIndex(kind)
+        return _indexes[kind]
+
+def find_duplicate(kind, text, exclude_video_id=None):
+    """(video_id, similarity) of an earlier video whose text is too close, else None"""
+    threshold = {'topic': config.SIMILARITY_TOPIC_THRESHOLD,
+                 'script': config.SIMILARITY_SCRIPT_THRESHOLD}[kind]
+    video_id, similarity = get_index(kind).nearest(text, exclude_video_id)
+    if video_id is not None and similarity >= threshold:
+        return video_id, similarity
+    return None
+
+def remember(kind, video_id, text):
+    get_index(kind).add(video_id, text)
+
+@atexit.register
+def _save_snapshots():
+    for index in list(_indexes.values()):
+        if index.unsaved:
+            try:
+                index.save()
+            except Exception:
+                pass
@@ -0,0 +1,161 @@
+import bisect
+import math
+import os
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import config
+
+@lru_cache(maxsize=8)
+def load_font(size):
+    """First of SUBTITLE_FONTS Pillow can open, else its built-in font"""
+    for name in config.SUBTITLE_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has no sized default font
+        return ImageFont.load_default()
+
+def caption_style(height):
+    """(font size, stroke width, side margin) for frames `height` pixels tall.
+
+    The SUBTITLE_* settings are for VIDEO_HEIGHT; other sizes (e.g. draft
+    renders) scale them so captions keep their proportions.
+    """
+    scale = height / config.VIDEO_HEIGHT
+    return (max(round(config.SUBTITLE_FONT_SIZE * scale), 1),
+            max(round(config.SUBTITLE_STROKE_WIDTH * scale), 1) if config.SUBTITLE_STROKE_WIDTH else 0,
+            round(config.SUBTITLE_MARGIN * scale))
+
+def wrap(text, font, max_width):
+    """Greedy word wrap of text to lines at most max_width pixels wide"""
+    lines = []
+    for word in text.split():
+        if lines and font.getlength(f'{lines[-1]} {word}') <= max_width:
+            lines[-1] = f'{lines[-1]} {word}'
+        else:
+            lines.append(word)
+    return '\n'.join(lines)
+
+@lru_cache(maxsize=512)
+def render_caption(text, max_width, size=None, stroke_width=None):
+    """A caption as (premultiplied RGB, inverse alpha) uint16 arrays, cropped to its ink.
+
+    White text with a black stroke, centred lines; rendered once per text
+    and reused for every frame the caption is on screen.
+    """
+    size = size or config.SUBTITLE_FONT_SIZE
+    stroke_width = config.SUBTITLE_STROKE_WIDTH if stroke_width is None else stroke_width
+    font = load_font(size)
+    text = wrap(text, font, max_width)
+
+    measure = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+    left, top, right, bottom = measure.multiline_textbbox((0, 0), text, font=font, align='center',
+                                                          stroke_width=stroke_width)
+    left, top, right, bottom = math.floor(left), math.floor(top), math.ceil(right), math.ceil(bottom)
+    image = Image.new('RGBA', (max(right - left, 1), max(bottom - top, 1)), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-left, -top), text, font=font, fill='white', align='center',
+                                         stroke_width=stroke_width, stroke_fill='black')
+    box = image.getbbox()
+    if box:
+        image = image.crop(box)
+
+    pixels = np.asarray(image, dtype=np.uint16)
+    alpha = pixels[:, :, 3:4]
+    return pixels[:, :, :3] * alpha, 255 - alpha
+
+class SubtitleOverlay:
+    """Burns timed captions into frames, for VideoClip.fl(overlay.apply).
+
+    Frames with no caption are returned untouched; otherwise only the
+    caption's bounding box is alpha-blended.
+    """
+
+    def __init__(self, subs, width, height):
+        self.subs = sorted(subs)  # ((start, end), text)
+        self.starts = [start for (start, _), _ in self.subs]
+        self.width = width
+        self.height = height
+        self.size, self.stroke_width, margin = caption_style(height)
+        self.max_width = width - 2 * margin
+
+    def caption_at(self, t):
+        """Text on screen at time t, or None"""
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i < 0:
+            return None
+        (start, end), text = self.subs[i]
+        return text if t < end else None
+
+    def apply(self, get_frame, t):
+        frame = get_frame(t)
+        text = self.caption_at(t)
+        if not text:
+            return frame
+
+        premultiplied, inverse_alpha = render_caption(text, self.max_width, self.size, self.stroke_width)
+        h, w = inverse_alpha.shape[:2]
+        frame_h, frame_w = frame.shape[:2]
+        # Centred, resting on the bottom edge; clipped if it would not fit
+        x = max((frame_w - w) // 2, 0)
+        y = max(frame_h - h, 0)
+        h, w = min(h, frame_h - y), min(w, frame_w - x)
+
+        # Source frames may be shared (ImageClip) or read-only, so blend into a copy
+        frame = frame.copy()
+        region = frame[y:y + h, x:x + w].astype(np.uint16)
+        blended = premultiplied[:h, :w] + region * inverse_alpha[:h, :w]
+        frame[y:y + h, x:x + w] = (blended + 127) // 255
+        return frame
+
+def font_dir():
+    """Directory of the caption font file, so libass finds the same font; None if built in"""
+    path = getattr(load_font(config.SUBTITLE_FONT_SIZE), 'path', None)
+    return os.path.dirname(os.path.abspath(path)) if isinstance(path, str) and os.path.exists(path) else None
+
+def ass_time(seconds):
+    """ASS timestamp H:MM:SS.cc"""
+    centiseconds = round(seconds * 100)
+    hours, rest = divmod(centiseconds, 360000)
+    minutes, rest = divmod(rest, 6000)
+    return f'{hours}:{minutes:02d}:{rest // 100:02d}.{rest % 100:02d}'
+
+def write_ass(subs, path, width, height):
+    """Write captions as an ASS file styled like the Pillow captions, for ffmpeg's ass filter.
+
+    Lines are pre-wrapped with wrap() and auto-wrapping is off, so both
+    render paths break lines in the same places.
+    """
+    size, stroke_width, margin = caption_style(height)
+    font = load_font(size)
+    family, style = font.getname() if hasattr(font, 'getname') else ('Arial', 'Bold')
+    bold = -1 if 'bold' in (style or '').lower() else 0
+    # libass sizes fonts by line height (ascent + descent), Pillow by em
+    line_height = sum(font.getmetrics())
+    max_width = width - 2 * margin
+    lines = [
+        '[Script Info]',
+        'ScriptType: v4.00+',
+        f'PlayResX: {width}',
+        f'PlayResY: {height}',
+        'WrapStyle: 2',
+        'ScaledBorderAndShadow: yes',
+        '',
+        '[V4+ Styles]',
+        'Format: Name, Fontname, Fontsize, PrimaryColour, OutlineColour, BackColour, Bold, '
+        'BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV',
+        f'Style: Caption,{family},{line_height},&H00FFFFFF,&H00000000,&H00000000,{bold},'
+        f'1,{stroke_width},0,2,{margin},{margin},0',
+        '',
+        '[Events]',
+        'Format: Layer, Start, End, Style, Text',
+    ]
+    for (start, end), text in sorted(subs):
+        text = wrap(text.replace('{', '(').replace('}', ')'), font, max_width).replace('\n', '\\N')
+        lines.append(f'Dialogue: 0,{ass_time(start)},{ass_time(end)},Caption,{text}')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
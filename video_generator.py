@@ -1,36 +1,39 @@
-import requests
+import asyncio
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 from moviepy.editor import *
-from moviepy.video.tools.subtitles import SubtitlesClip
 import config
+import ffmpeg_utils
+import footage_library
+import metrics
+import subtitles
 
-def download_stock_footage(topic, count=3):
-    """Download relevant stock footage from Pexels"""
+def download_stock_footage(topic, count=3, video_id=None, seconds=None, profile=None):
+    """Local paths of relevant Pexels stock footage, via the shared footage library
+
+    With seconds (the timeline length), clips the timeline never reaches are
+    skipped and the last one used is cut to what plays. Clips come as proxies
+    for the render profile (a config.RENDER_PROFILES entry, 'final' by default).
+    """
     if not config.PEXELS_API_KEY:
         print("⚠️  Pexels API key not set, using placeholder")
         return []
     
-    headers = {"Authorization": config.PEXELS_API_KEY}
-    url = f"https://api.pexels.com/videos/search?query={topic}&per_page={count}&orientation=landscape"
-    
-    response = requests.get(url, headers=headers)
-    videos = response.json().get('videos', [])
-    
-    footage_paths = []
-    for i, video in enumerate(videos):
-        video_file = video['video_files'][0]
-        video_url = video_file['link']
-        
-        output_path = f"temp/footage_{i}.mp4"
-        os.makedirs('temp', exist_ok=True)
-        
-        vid_response = requests.get(video_url)
-        with open(output_path, 'wb') as f:
-            f.write(vid_response.content)
-        
-        footage_paths.append(output_path)
+    assets = footage_library.search(topic, count, video_id=video_id)
+    return [footage_library.fetch(asset, video_id, needed, profile)
+            for asset, needed in footage_library.timeline_plan(assets, seconds)]
+
+async def download_stock_footage_async(topic, count=3, video_id=None, seconds=None, profile=None):
+    """download_stock_footage() off the event loop; clips are fetched concurrently"""
+    if not config.PEXELS_API_KEY:
+        print("⚠️  Pexels API key not set, using placeholder")
+        return []
     
-    return footage_paths
+    # Library lookups take file locks, so they run on threads rather than the loop
+    assets = await asyncio.to_thread(footage_library.search, topic, count, video_id)
+    return list(await asyncio.gather(*(asyncio.to_thread(footage_library.fetch, asset, video_id, needed, profile)
+                                       for asset, needed in footage_library.timeline_plan(assets, seconds))))
 
 def create_subtitles(script):
     """Generate subtitle file from script"""
@@ -47,47 +50,249 @@ def create_subtitles(script):
     
     return subs
 
-def create_video(audio_path, script, video_id, topic):
-    """Main function to create video with footage and subtitles"""
-    print("🎬 Creating video...")
-    
-    os.makedirs(config.VIDEO_DIR, exist_ok=True)
-    output_path = f"{config.VIDEO_DIR}/video_{video_id}.mp4"
-    
-    # Load audio
-    audio = AudioFileClip(audio_path)
-    duration = audio.duration
-    
-    # Download footage
-    footage_paths = download_stock_footage(topic.replace(' ', '+'))
-    
+BACKGROUND_COLOR = (20, 20, 40)  # fallback when there is no footage
+
+def fill_frame(clip, width, height):
+    """Scale a clip to cover a width x height frame and crop the overflow evenly"""
+    if tuple(clip.size) == (width, height):
+        return clip
+    scale = max(width / clip.w, height / clip.h)
+    clip = clip.resize(scale)
+    return clip.crop(x_center=clip.w / 2, y_center=clip.h / 2, width=width, height=height)
+
+def close_clips(clips):
+    """Stop the ffmpeg readers behind moviepy clips"""
+    for clip in clips:
+        clip.close()
+
+def moviepy_timeline(script, footage_paths, duration, profile, sources):
+    """Footage looped to duration with the captions burned in, as a moviepy clip without audio
+
+    The footage clips opened are appended to sources; close them with
+    close_clips() once the render is done.
+    """
+    width, height = profile['width'], profile['height']
     if footage_paths:
-        clips = [VideoFileClip(f).resize((config.VIDEO_WIDTH, config.VIDEO_HEIGHT)) 
-                 for f in footage_paths]
+        footage = []
+        for path in footage_paths:
+            footage.append(VideoFileClip(path))
+            sources.append(footage[-1])
+        clips = [fill_frame(clip, width, height) for clip in footage]
         
         # Loop clips to match audio duration
         video_clip = concatenate_videoclips(clips * int(duration / sum(c.duration for c in clips) + 1))
         video_clip = video_clip.subclip(0, duration)
     else:
         # Fallback: colored background
-        video_clip = ColorClip(size=(config.VIDEO_WIDTH, config.VIDEO_HEIGHT), 
-                               color=(20, 20, 40), duration=duration)
+        video_clip = ColorClip(size=(width, height), 
+                               color=BACKGROUND_COLOR, duration=duration)
     
-    # Add subtitles
-    subs = create_subtitles(script)
-    generator = lambda txt: TextClip(txt, font='Arial-Bold', fontsize=70, 
-                                     color='white', stroke_color='black', 
-                                     stroke_width=2, method='caption', 
-                                     size=(config.VIDEO_WIDTH-100, None))
-    subtitles = SubtitlesClip(subs, generator)
+    # Burn in subtitles: captions are rasterized once and blended only where they show
+    overlay = subtitles.SubtitleOverlay(create_subtitles(script), width, height)
+    return video_clip.fl(overlay.apply)
+
+def render_moviepy(audio_path, script, video_id, footage_paths, output_path, profile):
+    """Render frame by frame through moviepy"""
+    audio = AudioFileClip(audio_path)
+    sources = [audio]
+    try:
+        final = moviepy_timeline(script, footage_paths, audio.duration, profile, sources).set_audio(audio)
+        
+        # Export
+        with metrics.span('encode', kind='render', provider='moviepy', video_id=video_id) as span:
+            final.write_videofile(output_path, fps=profile['fps'], codec='libx264', 
+                                  audio_codec='aac', threads=4, preset=profile['preset'])
+            span['bytes'] = os.path.getsize(output_path)
+    finally:
+        # Left open, their ffmpeg processes outlive the render (and leak into forked children)
+        close_clips(sources)
+
+def encode_moviepy_segment(script, footage_paths, duration, profile, start, end, output_path, threads):
+    """Encode [start, end) of the moviepy timeline to a video-only file"""
+    sources = []
+    try:
+        clip = moviepy_timeline(script, footage_paths, duration, profile, sources).subclip(start, end)
+        clip.write_videofile(output_path, fps=profile['fps'], codec='libx264', audio=False,
+                             threads=threads, preset=profile['preset'], logger=None)
+    finally:
+        close_clips(sources)
+
+def footage_timeline(footage_paths, duration):
+    """(path, seconds) pieces looping the clips in order until duration is covered"""
+    lengths = [(path, ffmpeg_utils.duration(path)) for path in footage_paths]
+    lengths = [(path, length) for path, length in lengths if length > 0]
+    pieces, total = [], 0
+    while lengths and total < duration:
+        for path, length in lengths:
+            take = min(length, duration - total)
+            pieces.append((path, take))
+            total += take
+            if total >= duration:
+                break
+    return pieces
+
+def ffmpeg_timeline(script, footage_paths, duration, profile, ass_path, start=0, end=None):
+    """(input args, filtergraph) drawing [start, end) of the timeline, captions included, to [out]"""
+    width, height, fps = profile['width'], profile['height'], profile['fps']
+    end = duration if end is None else end
+    
+    # One input per piece of the looped footage in the window, each cut to the part that plays
+    inputs, filters, offset = [], [], 0
+    for path, take in footage_timeline(footage_paths or [], duration):
+        seek, play = max(start - offset, 0), min(offset + take, end) - max(offset, start)
+        offset += take
+        if play <= 0:
+            continue
+        i = len(filters)
+        inputs += ['-ss', f'{seek:.3f}', '-t', f'{play:.3f}', '-i', path]
+        filters.append(f'[{i}:v]{ffmpeg_utils.fill_filter(width, height, fps)}[v{i}]')
+    if filters:
+        filters.append(''.join(f'[v{i}]' for i in range(len(filters))) + f'concat=n={len(filters)}:v=1:a=0[bg]')
+    else:
+        color = '0x{:02x}{:02x}{:02x}'.format(*BACKGROUND_COLOR)
+        inputs += ['-f', 'lavfi', '-t', f'{end - start:.3f}', '-i', f'color=c={color}:s={width}x{height}:r={fps}']
+        filters.append('[0:v]format=yuv420p[bg]')
     
-    # Combine
-    final = CompositeVideoClip([video_clip, subtitles.set_position(('center', 'bottom'))])
-    final = final.set_audio(audio)
+    # Captions shifted to the window; ones straddling its edges are clipped
+    subs = [((max(s - start, 0), e - start), text) for (s, e), text in create_subtitles(script)
+            if e > start and s < end]
+    os.makedirs(os.path.dirname(ass_path) or '.', exist_ok=True)
+    ass = f'ass=filename={ffmpeg_utils.filter_escape(subtitles.write_ass(subs, ass_path, width, height))}'
+    fonts = subtitles.font_dir()
+    if fonts:
+        ass += f':fontsdir={ffmpeg_utils.filter_escape(fonts)}'
+    # Rounding at piece joins can leave the footage a frame short; hold the last frame
+    filters.append(f'[bg]tpad=stop_mode=clone:stop_duration=1,{ass}[out]')
+    return inputs, ';'.join(filters)
+
+def x264_args(profile):
+    return ['-c:v', 'libx264', '-preset', profile['preset'], '-pix_fmt', 'yuv420p', '-r', str(profile['fps'])]
+
+def render_ffmpeg(audio_path, script, video_id, footage_paths, output_path, profile):
+    """Render the same timeline as render_moviepy in one ffmpeg filtergraph; frames never enter Python"""
+    duration = ffmpeg_utils.duration(audio_path)
+    ass_path = f'temp/captions_{video_id}.ass'
+    inputs, graph = ffmpeg_timeline(script, footage_paths, duration, profile, ass_path)
     
-    # Export
-    final.write_videofile(output_path, fps=config.VIDEO_FPS, codec='libx264', 
-                          audio_codec='aac', threads=4, preset='medium')
+    try:
+        with metrics.span('encode', kind='render', provider='ffmpeg', video_id=video_id) as span:
+            ffmpeg_utils.run([*inputs, '-i', audio_path, '-filter_complex', graph,
+                              '-map', '[out]', '-map', f"{inputs.count('-i')}:a", *x264_args(profile),
+                              '-c:a', 'aac', '-ac', '2', '-ar', '44100', '-t', f'{duration:.3f}', '-movflags', '+faststart', output_path])
+            span['bytes'] = os.path.getsize(output_path)
+    finally:
+        os.remove(ass_path)
+
+def encode_ffmpeg_segment(script, footage_paths, duration, profile, start, end, output_path, threads):
+    """Encode [start, end) of the ffmpeg timeline to a video-only file"""
+    ass_path = f'{os.path.splitext(output_path)[0]}.ass'
+    inputs, graph = ffmpeg_timeline(script, footage_paths, duration, profile, ass_path, start, end)
+    try:
+        ffmpeg_utils.run([*inputs, '-filter_complex', graph, '-map', '[out]', *x264_args(profile),
+                          '-threads', str(threads), '-t', f'{end - start:.3f}', output_path])
+    finally:
+        os.remove(ass_path)
+
+RENDER_BACKENDS = {
+    'moviepy': render_moviepy,
+    'ffmpeg': render_ffmpeg,
+}
+
+SEGMENT_ENCODERS = {
+    'moviepy': encode_moviepy_segment,
+    'ffmpeg': encode_ffmpeg_segment,
+}
+
+def available_cpus():
+    """CPUs this process may run on (its affinity mask where the OS has one)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def segment_bounds(duration, workers):
+    """(start, end) of up to `workers` segments of at least RENDER_SEGMENT_MIN_SECONDS covering duration.
+
+    Cuts fall on whole multiples of FOOTAGE_PROXY_KEYINT seconds: frame
+    boundaries at the profiles' whole fps, and keyframes of the footage
+    proxies, so each segment seeks into its clips without decoding back.
+    """
+    count = max(1, min(workers, int(duration // config.RENDER_SEGMENT_MIN_SECONDS)))
+    step = config.FOOTAGE_PROXY_KEYINT
+    cuts = sorted({round(duration * i / count / step) * step for i in range(1, count)})
+    edges = [0] + [cut for cut in cuts if 0 < cut < duration] + [duration]
+    return list(zip(edges, edges[1:]))
+
+def render_segmented(backend, workers, audio_path, script, video_id, footage_paths, output_path, profile):
+    """Render with `backend` as segments encoded in parallel processes, then join them losslessly.
+
+    Every segment starts on a keyframe with the same encoder settings, so
+    they concatenate by stream copy; the audio is encoded once while muxing.
+    """
+    duration = ffmpeg_utils.duration(audio_path)
+    bounds = segment_bounds(duration, workers)
+    if len(bounds) == 1:
+        # Too short to be worth splitting
+        return RENDER_BACKENDS[backend](audio_path, script, video_id, footage_paths, output_path, profile)
+    threads = max(1, available_cpus() // len(bounds))
+    base = os.path.join('temp', os.path.splitext(os.path.basename(output_path))[0])
+    paths = [f'{base}_segment{i}.mp4' for i in range(len(bounds))]
+    os.makedirs('temp', exist_ok=True)
+    
+    try:
+        with metrics.span('encode', kind='render', provider=f'{backend}-segmented', video_id=video_id) as span:
+            # Spawned, not forked: children must not inherit the parent's pipes to ffmpeg readers
+            with ProcessPoolExecutor(max_workers=len(bounds),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(SEGMENT_ENCODERS[backend], script, footage_paths, duration, profile,
+                                       start, end, path, threads)
+                           for (start, end), path in zip(bounds, paths)]
+                for future in futures:
+                    future.result()
+            ffmpeg_utils.concat(paths, output_path, audio_path=audio_path,
+                                codec_args=('-c:v', 'copy', '-c:a', 'aac', '-ac', '2', '-ar', '44100',
+                                            '-t', f'{duration:.3f}', '-movflags', '+faststart'))
+            span['bytes'] = os.path.getsize(output_path)
+    finally:
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+def video_path(video_id, profile='final'):
+    """Output path of a video's render; drafts sit beside the final file"""
+    suffix = '' if profile == 'final' else f'_{profile}'
+    return f"{config.VIDEO_DIR}/video_{video_id}{suffix}.mp4"
+
+def create_video(audio_path, script, video_id, topic, footage_paths=None, backend=None, profile='final',
+                 segment_workers=None):
+    """Main function to create video with footage and subtitles
+
+    backend is a RENDER_BACKENDS key, RENDER_BACKEND by default; profile is a
+    config.RENDER_PROFILES key ('draft' renders small and fast for review).
+    segment_workers (RENDER_SEGMENT_WORKERS by default) splits the video
+    into that many segments encoded in parallel; 1 renders in one pass.
+    """
+    backend = backend or config.RENDER_BACKEND
+    if backend not in RENDER_BACKENDS:
+        raise Exception(f"Unknown render backend: {backend}")
+    if profile not in config.RENDER_PROFILES:
+        raise Exception(f"Unknown render profile: {profile}")
+    segment_workers = segment_workers or config.RENDER_SEGMENT_WORKERS
+    print(f"🎬 Creating {profile} video ({backend})...")
+    
+    os.makedirs(config.VIDEO_DIR, exist_ok=True)
+    output_path = video_path(video_id, profile)
+    
+    # Download footage (unless the caller already fetched it), only as much as the voiceover needs
+    if footage_paths is None:
+        footage_paths = download_stock_footage(topic.replace(' ', '+'), video_id=video_id,
+                                               seconds=ffmpeg_utils.duration(audio_path),
+                                               profile=config.RENDER_PROFILES[profile])
+    
+    args = (audio_path, script, video_id, footage_paths, output_path, config.RENDER_PROFILES[profile])
+    if segment_workers > 1:
+        render_segmented(backend, segment_workers, *args)
+    else:
+        RENDER_BACKENDS[backend](*args)
     
     print(f"✓ Video created: {output_path}")
     return output_path
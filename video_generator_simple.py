@@ -1,9 +1,11 @@
 import config
 import os
 
-def create_video(audio_path, script, video_id, topic):
+def create_video(audio_path, script, video_id, topic, footage_paths=None, backend=None, profile='final',
+                 segment_workers=None):
     """Simplified video generator - creates placeholder"""
-    video_path = f"{config.VIDEO_DIR}/video_{video_id}.mp4"
+    suffix = '' if profile == 'final' else f'_{profile}'
+    video_path = f"{config.VIDEO_DIR}/video_{video_id}{suffix}.mp4"
     
     print(f"  📹 Video generation simulated")
     print(f"  Audio: {audio_path}")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Pipeline worker - claims jobs from the queue and runs them"""
+
+import argparse
+import functools
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+import config
+import database
+import job_queue
+import pipeline
+
+def run_job(job, concurrency=1):
+    """Run a claimed job; returns the video id or None if the pipeline failed
+
+    concurrency is how many jobs the worker command runs at once; their
+    renders share the cores.
+    """
+    payload = job['payload']
+    # A retried job that already created its video resumes it instead of starting over
+    video_id = job['video_id'] or payload.get('video_id')
+    render = functools.partial(pipeline.video_generator.create_video, backend=payload.get('render_backend'),
+                               segment_workers=pipeline.segment_workers(concurrency))
+    if job['kind'] == 'resume' or video_id:
+        return pipeline.resume_pipeline(video_id, render=render)
+    if job['kind'] == 'create':
+        return pipeline.run_pipeline(
+            channel_id=payload.get('channel_id', 1),
+            content_source=payload.get('content_source', 'trending'),
+            custom_topic=payload.get('topic'),
+            render=render,
+            on_video=lambda vid: job_queue.attach_video(job['id'], vid)
+        )
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+def keep_alive(job_id, worker_id, stop):
+    """Heartbeat the job's lease until stop is set"""
+    while not stop.wait(config.JOB_HEARTBEAT_INTERVAL):
+        try:
+            if not job_queue.heartbeat(job_id, worker_id):
+                print(f"⚠️  [{worker_id}] Lost lease on job {job_id}")
+                return
+        except Exception as e:
+            print(f"⚠️  [{worker_id}] Heartbeat failed for job {job_id}: {e}")
+
+def worker_loop(worker_id, once=False, concurrency=1):
+    """Claim and run jobs until interrupted (or the queue is empty when once=True)"""
+    database.init_db()
+    print(f"👷 Worker {worker_id} started")
+
+    while True:
+        job = job_queue.claim(worker_id)
+        if not job:
+            if once:
+                return
+            time.sleep(config.JOB_POLL_INTERVAL)
+            continue
+
+        print(f"\n👷 [{worker_id}] Running job {job['id']} ({job['kind']}, attempt {job['attempts']})")
+        stop = threading.Event()
+        beat = threading.Thread(target=keep_alive, args=(job['id'], worker_id, stop), daemon=True)
+        beat.start()
+        try:
+            video_id = run_job(job, concurrency)
+            if video_id:
+                job_queue.finish(job['id'], worker_id, 'done', video_id=video_id)
+            else:
+                job_queue.finish(job['id'], worker_id, 'failed', error='Pipeline failed, see video error log')
+        except Exception:
+            job_queue.finish(job['id'], worker_id, 'failed', error=traceback.format_exc())
+        finally:
+            stop.set()
+            beat.join()
+
+def main(concurrency, once=False):
+    base_id = f"{socket.gethostname()}-{os.getpid()}"
+    database.init_db()
+    if concurrency == 1:
+        worker_loop(f"{base_id}-0", once, concurrency)
+        return
+
+    procs = [multiprocessing.Process(target=worker_loop, args=(f"{base_id}-{i}", once, concurrency))
+             for i in range(concurrency)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        # Leases of interrupted jobs expire and the jobs are picked up again
+        for proc in procs:
+            proc.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run pipeline jobs from the queue')
+    parser.add_argument('--concurrency', type=int, default=config.WORKER_CONCURRENCY,
+                        help='worker processes (one job each)')
+    parser.add_argument('--once', action='store_true', help='exit when the queue is empty')
+    args = parser.parse_args()
+    main(args.concurrency, args.once)